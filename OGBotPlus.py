@@ -1,13 +1,19 @@
 import asyncio
 import datetime
 from abc import ABC
-from typing import Dict, List, Iterable, Any, Union
+from typing import Dict, List, Iterable, Any, Union, Optional, Set
 
 import hikari
 import lightbulb
 from colorama import Fore
 
+from utils.dispatch import ChatDispatcher
+from utils.mentions import MentionIndex
+from utils.relay import RelayHub
 from utils.servers.base import BaseServer
+from utils.srcds_log import SrcdsLogListener, DEFAULT_LOG_PORT
+from utils.status import StatusScheduler
+from utils.watch import ExitWatcher
 
 
 class OGBotPlus(lightbulb.BotApp, ABC):
@@ -27,8 +33,42 @@ class OGBotPlus(lightbulb.BotApp, ABC):
         self.game_chat_info: Dict[str, str] = {}
         self._game_running = asyncio.Event()
         self._game_stopped = asyncio.Event()
+        self._exit_watcher: Optional[ExitWatcher] = None
+        self._srcds_log_listener: Optional[SrcdsLogListener] = None
+        self._relay: Optional[RelayHub] = None
+        self._mentions: Optional[MentionIndex] = None
+        self._status_scheduler: Optional[StatusScheduler] = None
+        self.chat_dispatch = ChatDispatcher(self.chat_channels)
+        # resolved from the cache on first use, and again after a channel or guild event touching them
+        self._chat_channels_obj: Optional[List[hikari.GuildChannel]] = None
+        self._main_guild_obj: Optional[List[hikari.Guild]] = None
+        self._missing_channels: Set[int] = set()  # already reported as missing
+        self.channels_version = 0
         super().__init__(intents=intents, prefix=prefix, owner_ids=owner_ids, ignore_bots=ignore_bots,
                          default_enabled_guilds=config['main_guilds'], **kwargs)
+        self.subscribe(hikari.GuildChannelDeleteEvent, self._on_channel_event)
+        self.subscribe(hikari.GuildChannelUpdateEvent, self._on_channel_event)
+        self.subscribe(hikari.GuildAvailableEvent, self._on_guild_event)
+        self.subscribe(hikari.GuildUpdateEvent, self._on_guild_event)
+        self.subscribe(hikari.GuildLeaveEvent, self._on_guild_event)
+
+    def invalidate_channels(self):
+        self._chat_channels_obj = None
+        self._main_guild_obj = None
+        self.channels_version += 1
+
+    async def _on_channel_event(self, event: Union[hikari.GuildChannelDeleteEvent, hikari.GuildChannelUpdateEvent]):
+        if event.channel_id not in self.chat_dispatch.chat_channels:
+            return
+        if isinstance(event, hikari.GuildChannelDeleteEvent):
+            self._missing_channels.add(int(event.channel_id))
+            self.bprint(f"Chat channel {event.channel_id} was deleted; no longer relaying to it.")
+        self.invalidate_channels()
+
+    async def _on_guild_event(self, event: Union[hikari.GuildAvailableEvent, hikari.GuildUpdateEvent,
+                                                 hikari.GuildLeaveEvent]):
+        # any guild can hold a chat channel, so this doesn't check main_guilds
+        self.invalidate_channels()
 
     async def wait_until_game_running(self, delay=0):
         await self._game_running.wait()
@@ -76,17 +116,14 @@ class OGBotPlus(lightbulb.BotApp, ABC):
         while True:
             if not self.game_statuses.keys():
                 if topic_set:
-                    for chan in self.chat_channels_obj:
-                        await chan.edit(topic="")
-                        await asyncio.sleep(1.5)
+                    self.relay.edit(key='topic', topic="")
+                    topic_set = False
                 await asyncio.sleep(5)
                 continue
             info = [v for k, v in self.game_chat_info.items()]
             try:
-                for chan in self.chat_channels_obj:
-                    topic = "Playing: " + "; ".join(info)
-                    await chan.edit(topic=topic)
-                    await asyncio.sleep(1.5)
+                # queued per channel; a newer topic replaces one that hasn't gone out yet
+                self.relay.edit(key='topic', topic="Playing: " + "; ".join(info))
                 topic_set = True
             except Exception as e:
                 print(e)
@@ -97,13 +134,49 @@ class OGBotPlus(lightbulb.BotApp, ABC):
     def loop(self):
         return asyncio.get_running_loop()
 
+    @property
+    def exit_watcher(self) -> ExitWatcher:
+        if self._exit_watcher is None:
+            self._exit_watcher = ExitWatcher(asyncio.get_running_loop())
+        return self._exit_watcher
+
+    @property
+    def srcds_log_listener(self) -> SrcdsLogListener:
+        if self._srcds_log_listener is None:
+            self._srcds_log_listener = SrcdsLogListener(asyncio.get_running_loop(), self.cfg['local_ip'],
+                                                        self.cfg.get('srcds_log_port', DEFAULT_LOG_PORT))
+        return self._srcds_log_listener
+
+    @property
+    def relay(self) -> RelayHub:
+        if self._relay is None:
+            self._relay = RelayHub(self, self.cfg.get('relay_flush_delay', 0.25), self.cfg.get('relay_mode', 'bot'))
+        return self._relay
+
+    @property
+    def status_scheduler(self) -> StatusScheduler:
+        if self._status_scheduler is None:
+            self._status_scheduler = StatusScheduler(self.cfg.get('status_interval', 30.0),
+                                                     self.cfg.get('status_active_interval', 10.0),
+                                                     self.cfg.get('status_max_interval', 300.0),
+                                                     self.cfg.get('status_timeout', 5.0))
+        return self._status_scheduler
+
+    @property
+    def mentions(self) -> MentionIndex:
+        if self._mentions is None:
+            self._mentions = MentionIndex(self.cache)
+        return self._mentions
+
     @property
     def is_game_running(self) -> bool:
         return self._game_running.is_set()
 
     @property
     def main_guild_obj(self) -> List[hikari.Guild]:
-        return [self.cache.get_guild(guild) for guild in self.main_guilds]
+        if self._main_guild_obj is None:
+            self._main_guild_obj = [self.cache.get_guild(guild) for guild in self.main_guilds]
+        return self._main_guild_obj
 
     @property
     def santa_channel_obj(self) -> hikari.GuildChannel:
@@ -111,15 +184,20 @@ class OGBotPlus(lightbulb.BotApp, ABC):
 
     @property
     def chat_channels_obj(self) -> List[hikari.GuildChannel]:
-        # return [self.cache.get_guild_channel(chan) for chan in self.chat_channels]
-        result = []
-        for chan in self.chat_channels:
-            try:
-                result.append(self.cache.get_guild_channel(chan))
-            except (hikari.ForbiddenError, hikari.NotFoundError):  # this is just a guess at what it'll raise
-                self.bprint(f"Couldn't find channel with id {chan}. It may have been deleted.")
-                continue
-        return result
+        # shared between callers; don't modify it
+        if self._chat_channels_obj is None:
+            result = []
+            for chan in self.chat_channels:
+                channel = self.cache.get_guild_channel(chan)
+                if channel is None:
+                    if chan not in self._missing_channels:
+                        self._missing_channels.add(chan)
+                        self.bprint(f"Couldn't find channel with id {chan}. It may have been deleted.")
+                    continue
+                self._missing_channels.discard(chan)
+                result.append(channel)
+            self._chat_channels_obj = result
+        return self._chat_channels_obj
 
     @property
     def is_game_stopped(self):
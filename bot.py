@@ -55,6 +55,16 @@ def load_config() -> dict:
             'tracked_guild_ids': [],
             'santa_channel': 0,
             'local_ip': '127.0.0.1',
+            'srcds_log_port': 22242,
+            'relay_flush_delay': 0.25,
+            'relay_mode': 'bot',  # or 'webhook': game chat is posted as the player, outside the bot's rate limits
+            'minecraft_avatar_url': 'https://mc-heads.net/avatar/{player}',
+            'minecraft_chat_mode': 'say',  # or 'tellraw': whole Discord messages as one JSON chat command (1.16+)
+            'minecraft_chat_delay': 0.25,
+            'status_interval': 30,  # seconds between status queries; stretched for empty or unreachable servers,
+            'status_active_interval': 10,  # and shortened to this while players are on
+            'status_max_interval': 300,
+            'status_timeout': 5,
             'default_rcon_password': '',
             'chat_channels': [0],
             'game_port_range': []
@@ -6,10 +6,8 @@ _all_ = [
     "colorama",
     "hikari",
     "hikari-lightbulb",
-    "mcrcon",
     "mcstatus",
     "pyfiglet",
-    "python-valve",
     "youtube_dl",
     "psutil",
     "regex",
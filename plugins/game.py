@@ -4,7 +4,7 @@
 import asyncio
 import logging
 from datetime import datetime
-from typing import Union
+from typing import Optional, Union
 
 import hikari
 import lightbulb
@@ -12,8 +12,9 @@ import psutil
 from docker.models.containers import Container
 
 # from OGBotPlus import OGBotPlus
-from utils import sensor
-from utils.servers import minecraft, source, base, docker_minecraft as mc_docker
+from utils import discovery, sensor
+from utils.servers import base
+from utils.servers.registry import server_types
 
 plugin = lightbulb.Plugin("Game")
 
@@ -40,33 +41,69 @@ async def on_start(_):
         asyncio.ensure_future(plugin.app.set_game_presence())
         asyncio.ensure_future(plugin.app.set_game_chat_info())
     if not check_server:
+        sensor.start_container_registry(loop)
         check_server = loop.create_task(server_running_loop())
     ports = plugin.app.cfg['game_port_range']
 
 
+@plugin.listener(hikari.StoppingEvent)
+async def on_stop(_):
+    sensor.stop_container_registry()
+    plugin.app.chat_dispatch.close()
+    plugin.app.status_scheduler.close()
+    try:
+        # give queued game chat a moment to go out before the connection closes
+        await asyncio.wait_for(plugin.app.relay.join(), 5)
+    except asyncio.TimeoutError:
+        pass
+    plugin.app.relay.close()
+
+
+@plugin.listener(hikari.MemberCreateEvent)
+async def on_member_create(event: hikari.MemberCreateEvent):
+    plugin.app.mentions.member_added(event.member)
+
+
+@plugin.listener(hikari.MemberUpdateEvent)
+async def on_member_update(event: hikari.MemberUpdateEvent):
+    plugin.app.mentions.member_added(event.member)
+
+
+@plugin.listener(hikari.MemberChunkEvent)
+async def on_member_chunk(event: hikari.MemberChunkEvent):
+    plugin.app.mentions.members_chunked(event.guild_id, event.members.values())
+
+
+@plugin.listener(hikari.MemberDeleteEvent)
+async def on_member_delete(event: hikari.MemberDeleteEvent):
+    plugin.app.mentions.member_removed(event.guild_id, event.user_id)
+
+
+@plugin.listener(hikari.GuildLeaveEvent)
+async def on_guild_leave(event: hikari.GuildLeaveEvent):
+    plugin.app.mentions.forget_guild(event.guild_id)
+
+
 @plugin.listener(hikari.GuildMessageCreateEvent)
 async def on_chat_message_in_chat_channel(event: hikari.GuildMessageCreateEvent):
-    if event.author.is_bot:
+    # the only guild message listener for chat; running servers get it through their dispatcher queue
+    if not plugin.app.chat_dispatch.dispatch(event):
         return
-    elif event.channel_id in plugin.app.chat_channels:
-        global last_sender_id
-        global last_guild_id
-        global last_message_time
-        if not event.message.content or len(event.message.content) < 1750:
-            msg = ''
-            if last_sender_id != int(event.author_id) \
-                    or last_guild_id != int(event.guild_id) \
-                    or int(datetime.now().timestamp()) > int(last_message_time) + 180:
-                msg += f"___**[{event.author.username} ({event.get_guild().name})]**___"
-            if event.message.content:
-                msg += "\n" + event.message.content
-            for chan in plugin.app.chat_channels_obj:
-                chan: hikari.GuildTextChannel
-                if chan.id != event.channel_id:
-                    await chan.send(msg, user_mentions=event.message.mentions.users,
-                                    attachments=event.message.attachments)
-        else:
-            await event.member.send("The message you sent was too long. `len(event.message.content) > 1750`")
+    global last_sender_id
+    global last_guild_id
+    global last_message_time
+    if not event.message.content or len(event.message.content) < 1750:
+        msg = ''
+        if last_sender_id != int(event.author_id) \
+                or last_guild_id != int(event.guild_id) \
+                or int(datetime.now().timestamp()) > int(last_message_time) + 180:
+            msg += f"___**[{event.author.username} ({event.get_guild().name})]**___"
+        if event.message.content:
+            msg += "\n" + event.message.content
+        plugin.app.relay.send(msg, exclude=event.channel_id, user_mentions=event.message.mentions.users,
+                              attachments=event.message.attachments)
+    else:
+        await event.member.send("The message you sent was too long. `len(event.message.content) > 1750`")
     # TODO: update these when a chat message is sent from the game, so it doesn't look like it was sent from the game
     last_sender_id = event.author_id
     last_guild_id = event.guild_id
@@ -74,69 +111,77 @@ async def on_chat_message_in_chat_channel(event: hikari.GuildMessageCreateEvent)
 
 
 async def server_running_loop():
-    known_running_servers = []
+    state = discovery.DiscoveryState()
     logging.info("Initializing server-check loop...")
     while plugin.app.is_alive:
-        any_server_running = sensor.are_servers_running(ports)
-        if any_server_running:
-            logging.info('At least 1 server is running. Checking...')
-            if not plugin.app.is_game_running:
-                plugin.app._game_stopped.clear()
-                plugin.app._game_running.set()
-            # print('test')
-            running_servers = sensor.get_running_servers(ports)
-            logging.info(f"Currently running server(s): {running_servers}")
-
-            new_servers = [(port, server) for port, server in running_servers if
-                           (isinstance(server, psutil.Process) and server.pid not in known_running_servers) or
-                           (isinstance(server, Container) and server.id not in known_running_servers)]
-            logging.info(f"New server(s): {new_servers}")
-            if not new_servers:
-                await asyncio.sleep(2)
-                continue
-            for port, server in new_servers:
-                # print("test 2")
-                data = sensor.get_game_info(server)
-                logging.info(f"Got server data: {data}")
-                plugin.app.games[str(port)] = generate_server_object(bot=plugin.app,
-                                                                     process=server,
-                                                                     gameinfo=data)
-                plugin.app.bprint(f"Server Status | Now Playing: {data['name']} ({port})")
-                known_running_servers = []
-                for _, x in running_servers:
-                    if isinstance(server, psutil.Process):
-                        known_running_servers.append(x.pid)
-                    elif isinstance(server, Container):
-                        known_running_servers.append(x.id)
-
-        elif not any_server_running and plugin.app.is_game_running:
+        snap = await sensor.snapshot(ports)
+        if snap.servers:
+            logging.info(f"Currently running server(s): {snap.servers}")
+        logging.debug(sensor.metrics)
+        logging.debug(plugin.app.relay)
+        logging.debug(plugin.app.chat_dispatch)
+        logging.debug(plugin.app.status_scheduler)
+
+        started, stopped = state.update(snap.servers)
+        for identity in stopped:
+            server_stopped(state, identity)
+        for identity, server in started:
+            await server_started(state, identity, server)
+
+        if snap.any_running and not plugin.app.is_game_running:
+            plugin.app._game_stopped.clear()
+            plugin.app._game_running.set()
+        elif not snap.any_running and plugin.app.is_game_running:
             plugin.app._game_running.clear()
             plugin.app._game_stopped.set()
-        await asyncio.sleep(5)
+        # container start/stop events wake this early; bare-metal processes are still picked up on the timeout
+        await sensor.container_registry.wait_for_change(5)
+
+
+async def server_started(state: discovery.DiscoveryState, identity: discovery.ServerIdentity,
+                         server: Union[Container, psutil.Process]):
+    logging.info(f"New server: {identity}")
+    try:
+        data = await sensor.game_info(server)
+    except Exception as e:
+        # forget it so the next tick tries again; an exception escaping here would end discovery for good
+        logging.error(f"Couldn't read game info for {identity}: {type(e).__name__}: {e}")
+        state.forget(identity)
+        return
+    logging.info(f"Got server data: {data}")
+    obj = generate_server_object(bot=plugin.app, process=server, gameinfo=data, port=identity.port)
+    state.known[identity] = obj
+    if obj is None:
+        return
+    plugin.app.games[str(identity.port)] = obj
+    plugin.app.bprint(f"Server Status | Now Playing: {data['name']} ({identity.port})")
+
+
+def server_stopped(state: discovery.DiscoveryState, identity: discovery.ServerIdentity):
+    logging.info(f"Server stopped: {identity}")
+    obj = state.forget(identity)
+    if obj is not None and plugin.app.games.get(str(identity.port)) is obj:
+        obj.teardown()
 
 
-def generate_server_object(bot, process: Union[Container, psutil.Process], gameinfo: dict) -> base.BaseServer:
-    executable = gameinfo['executable'].lower()
+def generate_server_object(bot, process: Union[Container, psutil.Process], gameinfo: dict,
+                           port: int = None) -> Optional[base.BaseServer]:
+    # server classes (and their rcon/query libraries) are only imported once a server of that type shows up
     if isinstance(process, Container):
-        process: Container
-        print('test')
-        if 'minecraft' in process.labels['com.docker.compose.service']:
-            print('found docker minecraft')
-            return mc_docker.MinecraftDockerServer(bot, process, **gameinfo)
-    elif isinstance(process, psutil.Process):
-        if 'srcds' in executable:
-            return source.SourceServer(bot, process, **gameinfo)
-        elif gameinfo['game'] == "minecraft" \
-                or ('java' in executable and ('forge' in ' '.join(gameinfo['command']))
-                    or 'server.jar' in ' '.join(gameinfo['command'])
-                    or 'nogui' in ' '.join(gameinfo['command'])):  # words cannot describe how scuffed this is.
-            return minecraft.MinecraftServer(bot, process, **gameinfo)
-        # elif 'valheim_server' in executable:
-        #     return valheim.ValheimServer(bot, process, **gameinfo)
-        elif 'terraria' in executable:
-            pass  # nyi
+        adapter = server_types.find('container', gameinfo, labels=process.labels, port=port)
     else:
+        adapter = server_types.find('process', gameinfo, port=port)
+    if adapter is None:
         print("Didn't find server... hm.")
+        return None
+    logging.info(f"Matched {gameinfo['name']} to {adapter}")
+    if port is not None:
+        # bot.games is keyed by the discovered port, and teardown pops the server's own, so they must agree
+        if 'port' in gameinfo and int(gameinfo['port']) != int(port):
+            logging.warning(f"{gameinfo['name']} | .gameinfo.toml says port {gameinfo['port']}, "
+                            f"but it's listening on {port}; using {port}")
+        gameinfo['port'] = port
+    return adapter.load()(bot, process, **gameinfo)
 
 
 async def receive_guild_chat(messages: list, **kwargs):
@@ -0,0 +1,141 @@
+"""Throughput, allocations and per-pattern cost of each server class's log parsing, on synthetic corpora.
+
+No bot, Discord or game server is needed: the server classes are instantiated without __init__ against
+tools.fakes.FakeBot, whose guild has a handful of members, so mention resolution is exercised too.
+
+    python -m tools.bench_logparse --lines 50000 --batch 64 --rounds 5
+    python -m tools.bench_logparse --mix chat=50,noise=50 --only source
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import regex
+
+from tools import corpora
+from tools.fakes import FakeBot, server_instance
+from utils import logparse
+
+
+def parsers() -> Dict[str, Tuple[Callable[[List[str]], object], Callable[[int, Optional[dict], int], list]]]:
+    # imported here so --help works without the bot's dependencies
+    from utils.servers.docker_minecraft import MinecraftDockerServer
+    from utils.servers.minecraft import MinecraftServer
+    from utils.servers.source import SourceServer
+
+    bot = FakeBot()
+    minecraft = server_instance(MinecraftServer, bot).parse_log_lines
+    docker = server_instance(MinecraftDockerServer, bot).parse_log_lines
+    return {
+        'minecraft-vanilla': (minecraft, lambda n, mix, seed: corpora.minecraft_corpus(n, 'vanilla', mix, seed)),
+        'minecraft-forge': (minecraft, lambda n, mix, seed: corpora.minecraft_corpus(n, 'forge', mix, seed)),
+        'minecraft-paper': (minecraft, lambda n, mix, seed: corpora.minecraft_corpus(n, 'paper', mix, seed)),
+        'docker-minecraft': (docker, lambda n, mix, seed: corpora.minecraft_corpus(n, 'vanilla', mix, seed)),
+        'source': (SourceServer.parse_log_lines, corpora.source_corpus),
+    }
+
+
+def batched(lines: List[str], size: int) -> List[List[str]]:
+    return [lines[i:i + size] for i in range(0, len(lines), size)]
+
+
+def best_of(fn, rounds: int) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def allocations(fn) -> Tuple[int, int, int]:
+    """(blocks still held, bytes still held, peak bytes) over one call."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        fn()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    return sum(s.count_diff for s in stats), sum(s.size_diff for s in stats), peak
+
+
+def accuracy(classify, corpus) -> Tuple[int, int]:
+    wrong = 0
+    for line, kind in corpus:
+        event = classify(line)
+        if (event.kind if event else None) != kind:
+            wrong += 1
+    return len(corpus) - wrong, wrong
+
+
+def pattern_costs(prefilter, prefix: str, patterns: Dict[str, str], lines: List[str], rounds: int):
+    """Seconds per pass over `lines` for the prefilter, the combined regex, and each pattern on its own."""
+    candidates = [line for line in lines if prefilter(line)]
+    costs = {'prefilter': best_of(lambda: [prefilter(line) for line in lines], rounds)}
+    combined = regex.compile(prefix + "(?:" + "|".join(patterns.values()) + ")")
+    costs['combined'] = best_of(lambda: [combined.search(line) for line in candidates], rounds)
+    for name, pattern in patterns.items():
+        compiled = regex.compile(prefix + pattern)
+        costs[name] = best_of(lambda: [compiled.search(line) for line in candidates], rounds)
+    return costs, len(candidates)
+
+
+def kind_costs(classify, corpus, rounds: int) -> Dict[str, Tuple[int, float]]:
+    by_kind: Dict[str, List[str]] = {}
+    for line, kind in corpus:
+        by_kind.setdefault(kind or corpora.NOISE, []).append(line)
+    return {kind: (len(lines), best_of(lambda: [classify(line) for line in lines], rounds))
+            for kind, lines in sorted(by_kind.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=64, help="lines handed to parse_log_lines at once")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mix', type=corpora.parse_mix, default=None,
+                        help="kind weights, e.g. chat=20,noise=70,death=10 (default: a busy server)")
+    parser.add_argument('--only', action='append', help="run only these corpora (repeatable)")
+    args = parser.parse_args()
+
+    for name, (parse, generate) in parsers().items():
+        if args.only and not any(o in name for o in args.only):
+            continue
+        source = name == 'source'
+        corpus = generate(args.lines, args.mix, args.seed)
+        lines = [line for line, _ in corpus]
+        batches = batched(lines, args.batch)
+
+        elapsed = best_of(lambda: [parse(batch) for batch in batches], args.rounds)
+        blocks, held, peak = allocations(lambda: [parse(batch) for batch in batches])
+        classify = logparse.classify_source if source else logparse.classify_minecraft
+        right, wrong = accuracy(classify, corpus)
+
+        print(f"{name}: {len(lines)} lines in batches of {args.batch}")
+        print(f"  {len(lines) / elapsed:12,.0f} lines/s   {elapsed / len(lines) * 1e6:7.2f} us/line")
+        print(f"  {peak / len(batches):12,.0f} B peak/batch   {blocks} blocks / {held} B still held")
+        print(f"  {right} classified as generated, {wrong} not")
+
+        if source:
+            costs, candidates = pattern_costs(logparse.source_prefilter, logparse.SOURCE_PREFIX,
+                                              logparse.SOURCE_PATTERNS, lines, args.rounds)
+        else:
+            costs, candidates = pattern_costs(lambda line: logparse.MINECRAFT_PREFILTER in line,
+                                              logparse.MINECRAFT_PREFIX, logparse.MINECRAFT_PATTERNS, lines,
+                                              args.rounds)
+        print(f"  per pattern ({candidates} of {len(lines)} lines pass the prefilter):")
+        for pattern, cost in costs.items():
+            per = cost / (len(lines) if pattern == 'prefilter' else max(candidates, 1))
+            print(f"    {pattern:12} {cost * 1000:9.2f} ms   {per * 1e6:7.2f} us/line")
+        print("  per kind, through classify:")
+        for kind, (count, cost) in kind_costs(classify, corpus, args.rounds).items():
+            print(f"    {kind:12} {count:7} lines {cost / count * 1e6:7.2f} us/line")
+
+
+if __name__ == '__main__':
+    main()
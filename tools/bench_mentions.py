@@ -0,0 +1,112 @@
+"""@mention resolution: the per-guild name trie against the linear member scan it replaces, on a synthetic guild.
+
+    python -m tools.bench_mentions --members 5000 --lines 2000 --channels 2
+"""
+import argparse
+import random
+import string
+import time
+from types import SimpleNamespace
+
+import lightbulb
+import regex
+
+from tools.bench_logparse import best_of
+from utils.mentions import MentionIndex
+
+
+def legacy_check_for_mentions(bot, message: str):
+    # BaseServer.check_for_mentions before the index, verbatim apart from being a function
+    indexes = [m.start() for m in regex.finditer('@', message)]
+    mentioned_members = []
+    for index in indexes:
+        try:
+            mention = message[index + 1:]
+            for chan in bot.chat_channels_obj:
+                for ind in range(0, min(len(mention) + 1, 32)):
+                    member = lightbulb.utils.find(bot.cache.get_guild(chan.guild_id).get_members().values(),
+                                                  lambda m: m.username == mention[:ind] or
+                                                            m.nickname == mention[:ind])
+                    if member:
+                        mentioned_members.append(member)
+                        message = message.replace("@" + mention[:ind], f"<@{member.id}>")
+                        break
+        except Exception as e:
+            print(e)
+    return mentioned_members, message
+
+
+def build_bot(members: int, channels: int, seed: int):
+    rng = random.Random(seed)
+    guilds = {}
+    names = []
+    for guild_id in range(1, channels + 1):
+        roster = {}
+        for i in range(members):
+            username = ''.join(rng.choices(string.ascii_lowercase + string.digits + '_', k=rng.randint(3, 16)))
+            nickname = rng.choice([None, None, username.title(), 'xX' + username[:8] + 'Xx'])
+            member_id = guild_id * 1_000_000 + i
+            roster[member_id] = SimpleNamespace(id=member_id, username=username, nickname=nickname,
+                                                guild_id=guild_id)
+            names.append(nickname or username)
+        guilds[guild_id] = SimpleNamespace(get_members=lambda r=roster: r)
+    cache = SimpleNamespace(get_guild=guilds.get)
+    bot = SimpleNamespace(chat_channels_obj=[SimpleNamespace(guild_id=g) for g in guilds], cache=cache)
+    return bot, names
+
+
+def build_lines(names, lines: int, mention_rate: float, seed: int):
+    rng = random.Random(seed + 1)
+    out = []
+    for _ in range(lines):
+        words = rng.choices(['gg', 'anyone', 'on', 'lol', 'come', 'here', 'base', 'thanks'], k=rng.randint(2, 10))
+        if rng.random() < mention_rate:
+            target = rng.choice(names) if rng.random() < 0.8 else 'nobody' + str(rng.randint(0, 99))
+            words.insert(rng.randrange(len(words) + 1), '@' + target)
+        out.append(f"<Steve> {' '.join(words)}")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=5000, help="members per guild")
+    parser.add_argument('--channels', type=int, default=1, help="chat channels, each in its own guild")
+    parser.add_argument('--lines', type=int, default=2000)
+    parser.add_argument('--mention-rate', type=float, default=0.2, help="share of lines with an @")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    bot, names = build_bot(args.members, args.channels, args.seed)
+    lines = build_lines(names, args.lines, args.mention_rate, args.seed)
+    guild_ids = [chan.guild_id for chan in bot.chat_channels_obj]
+
+    start = time.perf_counter()
+    index = MentionIndex(bot.cache)
+    for guild_id in guild_ids:
+        index.trie(guild_id)
+    build = time.perf_counter() - start
+
+    indexed = best_of(lambda: [index.resolve(line, guild_ids) for line in lines], args.rounds)
+    legacy = best_of(lambda: [legacy_check_for_mentions(bot, line) for line in lines], 1)
+
+    agree = differ = 0
+    for line in lines:
+        new_ids, new_text = index.resolve(line, guild_ids)
+        old_members, old_text = legacy_check_for_mentions(bot, line)
+        if new_text == old_text:
+            agree += 1
+        else:
+            differ += 1  # the old scan takes the shortest matching prefix and is case-sensitive
+
+    mentions = sum('@' in line for line in lines)
+    print(f"{args.channels} guild(s) x {args.members} members, {len(lines)} lines, {mentions} with an @")
+    print(f"trie build    {build * 1000:9.2f} ms")
+    print(f"trie resolve  {indexed * 1000:9.2f} ms   {indexed / len(lines) * 1e6:9.2f} us/line")
+    print(f"linear scan   {legacy * 1000:9.2f} ms   {legacy / len(lines) * 1e6:9.2f} us/line   "
+          f"({legacy / indexed:.0f}x slower)")
+    print(f"same output for {agree} lines, different for {differ}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Compare the /proc/net port index against the psutil scan it replaces, on a synthetic /proc tree.
+
+    python -m tools.bench_sensor --procs 3000 --sockets 4 --rounds 5
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from os import path
+
+import psutil
+
+from utils import procnet
+
+GAME_PORTS = [25565, 2456, 2457, [27015, 27020]]
+TABLE_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+def _row(i: int, port: int, state: str, inode: int, v6: bool = False) -> str:
+    addr = "00000000000000000000000000000000" if v6 else "00000000"
+    rem = addr + ":0000" if state != '01' else addr + ":D431"
+    return (f"{i:4}: {addr}:{port:04X} {rem} {state} 00000000:00000000 00:00000000 00000000  1000        0 "
+            f"{inode} 1 0000000000000000 100 0 0 10 0\n")
+
+
+def build_tree(root: str, procs: int, sockets: int, games: int) -> int:
+    """Write a fake /proc with `procs` processes holding `sockets` sockets each; `games` of them are servers."""
+    os.makedirs(path.join(root, 'net'))
+    with open(path.join(root, 'stat'), 'w') as f:
+        f.write("cpu  1 1 1 1 1 1 1 0 0 0\nbtime 1700000000\n")
+
+    rows = {'tcp': [], 'tcp6': [], 'udp': [], 'udp6': []}
+    game_ports = [25565, 2456, 27015, 27016, 27017]
+    inode = 10000
+    rng = random.Random(1)
+    for pid in range(1, procs + 1):
+        proc_dir = path.join(root, str(pid))
+        os.makedirs(path.join(proc_dir, 'fd'))
+        with open(path.join(proc_dir, 'stat'), 'w') as f:
+            f.write(f"{pid} (proc{pid}) S 1 {pid} {pid} 0 -1 4194560 " + "0 " * 11 + "20 0 1 0 100 " + "0 " * 30 + "\n")
+        with open(path.join(proc_dir, 'comm'), 'w') as f:
+            f.write(f"proc{pid}\n")
+        os.symlink(path.join(root, 'net'), path.join(proc_dir, 'net'))
+        for fd in range(3):
+            os.symlink('/dev/null', path.join(proc_dir, 'fd', str(fd)))
+        for fd in range(3, 3 + sockets):
+            inode += 1
+            if pid <= games and fd == 3:
+                port = game_ports[(pid - 1) % len(game_ports)]
+                table, state = ('udp', '07') if port == 2456 else ('tcp', '0A')
+            else:
+                port = rng.randint(30000, 60000)
+                table, state = rng.choice((('tcp', '01'), ('tcp6', '0A'), ('udp', '07'), ('tcp', '0A')))
+            rows[table].append(_row(len(rows[table]), port, state, inode, v6=table.endswith('6')))
+            os.symlink(f'socket:[{inode}]', path.join(proc_dir, 'fd', str(fd)))
+
+    for table, lines in rows.items():
+        with open(path.join(root, 'net', table), 'w') as f:
+            f.write(TABLE_HEADER)
+            f.writelines(lines)
+    return inode
+
+
+def psutil_scan(ports):
+    # the pre-index get_running_servers loop, verbatim apart from the flattened port list
+    running = []
+    used = []
+    for p in psutil.process_iter():
+        try:
+            if not p.connections(kind='inet4'):
+                continue
+            connections = [y.laddr.port for y in p.connections(kind='inet4')]
+        except (psutil.AccessDenied, psutil.NoSuchProcess):
+            continue
+        connections.sort()
+        for x in connections:
+            if x in ports and p not in used:
+                running.append((x, p))
+                used.append(p)
+    return running
+
+
+def timed(fn, rounds):
+    best = float('inf')
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--procs', type=int, default=2000)
+    parser.add_argument('--sockets', type=int, default=4, help="sockets per process")
+    parser.add_argument('--games', type=int, default=3, help="how many processes are game servers")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='fakeproc-')
+    try:
+        build_tree(root, args.procs, args.sockets, args.games)
+        flat_ports = [25565, 2456, 2457] + list(range(27015, 27021))
+
+        index = procnet.PortIndex(GAME_PORTS, proc_root=root)
+        cold, found = timed(lambda: procnet.PortIndex(GAME_PORTS, proc_root=root).scan(), args.rounds)
+        warm, found = timed(index.scan, args.rounds)
+        print(f"procnet index  cold {cold * 1000:8.2f} ms   warm {warm * 1000:8.2f} ms   found {found}")
+
+        old_procfs = psutil.PROCFS_PATH
+        psutil.PROCFS_PATH = root
+        try:
+            legacy, found = timed(lambda: psutil_scan(flat_ports), args.rounds)
+            print(f"psutil scan         {legacy * 1000:8.2f} ms                     "
+                  f"found {[(port, p.pid) for port, p in found]}")
+        except Exception as e:  # psutil internals change between versions
+            print(f"psutil scan could not read the synthetic tree: {type(e).__name__}: {e}")
+        finally:
+            psutil.PROCFS_PATH = old_procfs
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Synthetic game-server log corpora for the offline benchmarks and the replay harness.
+
+Each generator returns (line, kind) pairs where kind is the logparse kind the line should classify as, or None
+for noise the relay must skip.
+"""
+import random
+from typing import Dict, List, Optional, Tuple
+
+from utils import logparse
+
+NOISE = 'noise'
+MINECRAFT_FLAVORS = ('vanilla', 'forge', 'paper')
+
+# rough shape of a busy survival server: mostly noise, then chat, then everything else
+MINECRAFT_MIX = {NOISE: 70, logparse.CHAT: 15, logparse.JOIN: 3, logparse.LEAVE: 3, logparse.DEATH: 4,
+                 logparse.ADVANCEMENT: 2, logparse.SERVER: 3}
+SOURCE_MIX = {NOISE: 80, logparse.CHAT: 14, logparse.JOIN: 3, logparse.LEAVE: 3}
+
+PLAYERS = ['Steve', 'Alex', 'Notch', 'jeb_', 'Dinnerbone', 'xX_Sniper_Xx', 'Grumm', 'Kai', 'Sunny', 'Zuri']
+WORDS = ('hello anyone on lol gg brb where is the base need iron diamonds creeper blew up my house '
+         'ok thanks nice one coming over wait for me').split()
+DEATHS = ['was slain by Zombie', 'was shot by Skeleton', 'drowned', 'fell from a high place', 'blew up',
+          'tried to swim in lava', 'was blown up by Creeper', 'starved to death', 'hit the ground too hard',
+          'went up in flames', 'was pricked to death', 'withered away']
+ADVANCEMENTS = ['has made the advancement [Stone Age]', 'has made the advancement [Acquire Hardware]',
+                'has completed the challenge [Return to Sender]', 'has reached the goal [Sky\'s the Limit]']
+SERVER_FEEDBACK = ['[Rcon: Saved the game]', '[Server: Set the time to 1000]', '[Steve: Teleported Steve to Alex]']
+MINECRAFT_NOISE = [
+    ('Server thread', 'INFO', 'Saving chunks for level \'ServerLevel[world]\'/minecraft:overworld'),
+    ('Server thread', 'INFO', 'ThreadedAnvilChunkStorage (world): All chunks are saved'),
+    ('Server thread', 'WARN', 'Can\'t keep up! Is the server overloaded? Running 2041ms or 40 ticks behind'),
+    ('Server thread', 'INFO', 'Steve[/10.0.0.2:51234] logged in with entity id 312 at (12.5, 64.0, -8.5)'),
+    ('Server thread', 'INFO', 'Steve lost connection: Disconnected'),
+    ('User Authenticator #1', 'INFO', 'UUID of player Steve is 069a79f4-44e9-4726-a5be-fca90e38aaf5'),
+    ('Server thread', 'INFO', 'Preparing spawn area: 83%'),
+    ('Worker-Main-4', 'ERROR', 'Failed to load data for chunk [12, -4]'),
+    ('Server thread', 'WARN', 'Steve moved too quickly! 12.3,0.0,4.1'),
+    ('Server thread', 'INFO', 'Done (12.345s)! For help, type "help"'),
+]
+FORGE_LOGGERS = ['minecraft/DedicatedServer', 'minecraft/MinecraftServer', 'forge/ForgeHooks', 'FML/ModLoader']
+
+SOURCE_TEAMS = ['Red', 'Blue', 'Unassigned', 'Spectator', '']
+SOURCE_NOISE = [
+    '"{p}" triggered "killedobject" (object "OBJ_SENTRYGUN") (weapon "tf_projectile_rocket")',
+    'World triggered "Round_Start"',
+    'World triggered "Round_Win" (winner "Red")',
+    '"{p}" killed "{q}" with "scattergun" (attacker_position "-123 456 78") (victim_position "12 34 56")',
+    '"{p}" joined team "Blue"',
+    '"{p}" changed role to "soldier"',
+    'server_cvar: "mp_timelimit" "30"',
+    'rcon from "10.0.0.5:51322": command "status"',
+    '"{p}" say "|D> console echo"',  # discord relay echo; must be skipped
+    '"{p}" entered the game',
+]
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """`chat=20,noise=70,death=10` -> {'chat': 20, 'noise': 70, 'death': 10}"""
+    mix = {}
+    for part in filter(None, spec.split(',')):
+        kind, _, weight = part.partition('=')
+        mix[kind.strip()] = int(weight or 1)
+    return mix
+
+
+def _sentence(rng: random.Random, mention_rate: float = 0.05) -> str:
+    words = rng.choices(WORDS, k=rng.randint(1, 12))
+    if rng.random() < mention_rate:
+        words.insert(rng.randrange(len(words) + 1), '@' + rng.choice(PLAYERS))
+    return ' '.join(words)
+
+
+def _minecraft_prefix(flavor: str, clock: str, thread: str, level: str, rng: random.Random) -> str:
+    if flavor == 'paper':
+        return f"[{clock} {level}]: "
+    if flavor == 'forge':
+        logger = 'minecraft/DedicatedServer' if thread == 'Server thread' and level == 'INFO' \
+            else rng.choice(FORGE_LOGGERS)
+        return f"[{clock}] [{thread}/{level}] [{logger}]: "
+    return f"[{clock}] [{thread}/{level}]: "
+
+
+def _minecraft_event(kind: str, rng: random.Random) -> Tuple[str, str, str]:
+    player = rng.choice(PLAYERS)
+    if kind == logparse.CHAT:
+        style = rng.random()
+        if style < 0.85:
+            return 'Server thread', 'INFO', f"<{player}> {_sentence(rng)}"
+        if style < 0.95:
+            return 'Server thread', 'INFO', f"* {player} {_sentence(rng)}"
+        return 'Server thread', 'INFO', f"[Server] {_sentence(rng)}"
+    if kind == logparse.JOIN:
+        return 'Server thread', 'INFO', f"{player} joined the game"
+    if kind == logparse.LEAVE:
+        return 'Server thread', 'INFO', f"{player} left the game"
+    if kind == logparse.DEATH:
+        return 'Server thread', 'INFO', f"{player} {rng.choice(DEATHS)}"
+    if kind == logparse.ADVANCEMENT:
+        return 'Server thread', 'INFO', f"{player} {rng.choice(ADVANCEMENTS)}"
+    if kind == logparse.SERVER:
+        return 'Server thread', 'INFO', rng.choice(SERVER_FEEDBACK)
+    return rng.choice(MINECRAFT_NOISE)
+
+
+def minecraft_corpus(size: int, flavor: str = 'vanilla', mix: Optional[Dict[str, int]] = None,
+                     seed: int = 0) -> List[Tuple[str, Optional[str]]]:
+    if flavor not in MINECRAFT_FLAVORS:
+        raise ValueError(f"unknown Minecraft log flavor {flavor!r}, expected one of {MINECRAFT_FLAVORS}")
+    rng = random.Random(seed)
+    mix = mix or MINECRAFT_MIX
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=size)
+    corpus = []
+    for i, kind in enumerate(kinds):
+        clock = f"{(i // 3600) % 24:02}:{(i // 60) % 60:02}:{i % 60:02}"
+        thread, level, body = _minecraft_event(kind, rng)
+        corpus.append((_minecraft_prefix(flavor, clock, thread, level, rng) + body, None if kind == NOISE else kind))
+    return corpus
+
+
+def _source_player(rng: random.Random, uid: int) -> str:
+    return f"{rng.choice(PLAYERS)}<{uid % 32 + 2}><[U:1:{100000 + uid}]><{rng.choice(SOURCE_TEAMS)}>"
+
+
+def source_corpus(size: int, mix: Optional[Dict[str, int]] = None, seed: int = 0) -> List[Tuple[str, Optional[str]]]:
+    rng = random.Random(seed)
+    mix = mix or SOURCE_MIX
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=size)
+    corpus = []
+    for i, kind in enumerate(kinds):
+        stamp = f"L 10/18/2026 - {(i // 3600) % 24:02}:{(i // 60) % 60:02}:{i % 60:02}: "
+        player = _source_player(rng, i)
+        if kind == logparse.CHAT:
+            body = f'"{player}" {rng.choice(("say", "say", "say_team"))} "{_sentence(rng)}"'
+        elif kind == logparse.JOIN:
+            body = f'"{player}" connected, address "10.0.{i % 250}.{rng.randint(2, 250)}:27005"'
+        elif kind == logparse.LEAVE:
+            body = f'"{player}" disconnected (reason "{rng.choice(("Disconnect by user.", "timed out", "Kicked"))}")'
+        else:
+            body = rng.choice(SOURCE_NOISE).format(p=player, q=_source_player(rng, i + 1))
+        corpus.append((stamp + body, None if kind == NOISE else kind))
+    return corpus
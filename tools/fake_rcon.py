@@ -0,0 +1,197 @@
+"""A local RCON server that speaks like Minecraft or srcds, for running the RCON client and the guild-to-game paths
+without a game server.
+
+    python -m tools.fake_rcon --flavor minecraft --port 25575 --password hunter2
+    python -m tools.fake_rcon --check
+
+`--check` runs the client against it: pipelining, a response split over several packets, a bad password, a hung
+server and a restart.
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable, List, Optional
+
+from utils.rcon import (SERVERDATA_AUTH, SERVERDATA_AUTH_RESPONSE, SERVERDATA_EXECCOMMAND, SERVERDATA_RESPONSE_VALUE,
+                        RconAuthError, RconClient, RconConnectionError, RconTimeoutError, encode_packet, read_packet)
+
+MAX_RESPONSE_BODY = 4096  # both games split longer responses over several packets
+
+
+def default_handler(command: str) -> str:
+    name, _, args = command.partition(' ')
+    if name == 'seed':
+        return "Seed: [-1234567890]"
+    if name == 'list':
+        return "There are 0 of a max of 20 players online: "
+    if name == 'echo':
+        return args
+    if name == 'big':  # a response long enough to be split
+        return ''.join(chr(ord('a') + i % 26) for i in range(int(args or 10000)))
+    if name in ('say', 'tellraw'):
+        return ''
+    return f"Unknown command: {name}"
+
+
+class FakeRconServer:
+    """Records every command it runs in `commands`. `delay` is how long each command takes; while `hung` is set
+    commands are read but never answered."""
+
+    def __init__(self, password: str = 'hunter2', flavor: str = 'minecraft', host: str = '127.0.0.1', port: int = 0,
+                 handler: Callable[[str], str] = default_handler, delay: float = 0.0):
+        self.password = password
+        self.flavor = flavor
+        self.host = host
+        self.port = port
+        self.handler = handler
+        self.delay = delay
+        self.hung = False
+        self.commands: List[str] = []
+        self.connections = 0
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._clients = set()
+
+    async def start(self) -> 'FakeRconServer':
+        self._server = await asyncio.start_server(self._client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        """Stops listening and drops every client, like the game server exiting."""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for task in list(self._clients):
+            task.cancel()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._clients.add(asyncio.current_task())
+        authed = False
+        try:
+            while True:
+                request_id, packet_type, body = await read_packet(reader)
+                text = body.decode('utf-8', 'replace')
+                if packet_type == SERVERDATA_AUTH:
+                    authed = text == self.password
+                    if self.flavor == 'source':
+                        writer.write(encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, ''))
+                    writer.write(encode_packet(request_id if authed else -1, SERVERDATA_AUTH_RESPONSE, ''))
+                elif not authed:
+                    break
+                elif packet_type == SERVERDATA_EXECCOMMAND:
+                    self.commands.append(text)
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    if self.hung:
+                        continue
+                    response = self.handler(text)
+                    for i in range(0, max(len(response), 1), MAX_RESPONSE_BODY):
+                        writer.write(encode_packet(request_id, SERVERDATA_RESPONSE_VALUE,
+                                                   response[i:i + MAX_RESPONSE_BODY]))
+                elif self.hung:
+                    continue
+                elif self.flavor == 'source':
+                    # srcds mirrors an empty RESPONSE_VALUE, then sends a second packet with an odd body
+                    writer.write(encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, ''))
+                    writer.write(encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, '\x00\x01\x00\x00'))
+                else:
+                    writer.write(encode_packet(request_id, SERVERDATA_RESPONSE_VALUE,
+                                               f"Unknown request {packet_type:x}"))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError, RconConnectionError):
+            pass
+        finally:
+            self._clients.discard(asyncio.current_task())
+            writer.close()
+
+
+async def check(flavor: str):
+    server = await FakeRconServer(flavor=flavor).start()
+    client = RconClient('127.0.0.1', server.port, server.password, timeout=1, min_backoff=0.2, name=flavor)
+
+    print(f"--- {flavor}")
+    print(f"seed                 {await client.command('seed')!r}")
+    big = await client.command('big 10000')
+    print(f"10000 char response  {len(big)} chars, intact={big == default_handler('big 10000')}")
+
+    lines = [f"say line {i}" for i in range(200)]
+    start = time.perf_counter()
+    for line in lines:
+        await client.command(line)
+    one_by_one = time.perf_counter() - start
+    start = time.perf_counter()
+    await client.commands(lines)
+    pipelined = time.perf_counter() - start
+    print(f"200 say, one by one  {one_by_one * 1000:7.1f} ms")
+    print(f"200 say, pipelined   {pipelined * 1000:7.1f} ms   order kept={server.commands[-200:] == lines}")
+
+    server.hung = True
+    start = time.perf_counter()
+    try:
+        await client.command('seed', timeout=0.3)
+    except RconTimeoutError as e:
+        print(f"hung server          {type(e).__name__} after {time.perf_counter() - start:.2f}s")
+    server.hung = False
+
+    port = server.port
+    await server.close()
+    await asyncio.sleep(0.05)
+    try:
+        await client.command('seed')
+    except RconConnectionError as e:
+        print(f"server gone          {type(e).__name__}")
+    try:
+        await client.command('seed')
+    except RconConnectionError as e:
+        print(f"  again at once      {e}")
+    server = await FakeRconServer(flavor=flavor, port=port).start()
+    await asyncio.sleep(0.5)
+    print(f"restarted            {await client.command('echo back')!r}, connects={client.connects}")
+
+    bad = RconClient('127.0.0.1', server.port, 'wrong', name=flavor)
+    try:
+        await bad.command('seed')
+    except RconAuthError as e:
+        print(f"wrong password       {type(e).__name__}: {e}")
+
+    print(client)
+    client.close()
+    bad.close()
+    await server.close()
+
+
+async def serve(args):
+    server = await FakeRconServer(args.password, args.flavor, args.host, args.port, delay=args.delay).start()
+    print(f"fake {args.flavor} RCON listening on {args.host}:{server.port}")
+    while True:
+        count = len(server.commands)
+        await asyncio.sleep(1)
+        for command in server.commands[count:]:
+            print(f"> {command}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flavor', choices=['minecraft', 'source'], default='minecraft')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=25575)
+    parser.add_argument('--password', default='hunter2')
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds each command takes")
+    parser.add_argument('--check', action='store_true', help="run the RCON client against both flavors and exit")
+    args = parser.parse_args()
+    if args.check:
+        async def both():
+            await check('minecraft')
+            await check('source')
+        asyncio.run(both())
+    else:
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
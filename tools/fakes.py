@@ -0,0 +1,112 @@
+"""Just enough of the bot and Discord for the server classes to run their relay paths offline."""
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+
+from tools import corpora
+from utils.dispatch import ChatDispatcher
+from utils.mentions import MentionIndex
+from utils.relay import RelayHub
+
+
+class StubGuild:
+    def __init__(self, names: List[str]):
+        self._members = {i: SimpleNamespace(id=i, username=name, nickname=None) for i, name in enumerate(names, 1)}
+
+    def get_members(self):
+        return self._members
+
+
+class RecordingChannel:
+    """Stands in for a hikari.GuildTextChannel; every send is timestamped and kept.
+
+    `send_delay` simulates a slow or rate-limited Discord.
+    """
+
+    def __init__(self, channel_id: int = 100, guild_id: int = 1, send_delay: float = 0.0):
+        self.id = channel_id
+        self.guild_id = guild_id
+        self.send_delay = send_delay
+        self.sent = []  # (perf_counter when send was issued, content, kwargs)
+        self.on_send = None
+
+    async def send(self, content: str = '', **kwargs):
+        self.sent.append((time.perf_counter(), content, kwargs))
+        if self.on_send is not None:
+            self.on_send(self)
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        return SimpleNamespace(id=len(self.sent), channel_id=self.id, content=content)
+
+
+class FakeWebhook:
+    """Executions are recorded on the channel like sends, with the username and avatar in the kwargs."""
+
+    def __init__(self, channel: RecordingChannel, name: str):
+        self.channel = channel
+        self.name = name
+        self.token = 'token'
+
+    async def execute(self, content: str = '', **kwargs):
+        return await self.channel.send(content, webhook=self.name, **kwargs)
+
+
+class FakeRest:
+    def __init__(self, channels: List[RecordingChannel]):
+        self.channels = {chan.id: chan for chan in channels}
+        self.webhooks_created = 0
+
+    async def fetch_channel_webhooks(self, channel):
+        return []
+
+    async def create_webhook(self, channel, name: str, **kwargs) -> FakeWebhook:
+        self.webhooks_created += 1
+        return FakeWebhook(self.channels[int(channel)], name)
+
+
+class FakeExitWatcher:
+    def __init__(self):
+        self._exited: Optional[asyncio.Future] = None
+
+    def watch(self, pid: int) -> asyncio.Future:
+        if self._exited is None:
+            self._exited = asyncio.get_event_loop().create_future()
+        return self._exited
+
+    def exit(self):
+        if self._exited is not None and not self._exited.done():
+            self._exited.set_result(None)
+
+
+class FakeBot:
+    def __init__(self, channels: Optional[List[RecordingChannel]] = None, members: List[str] = corpora.PLAYERS,
+                 relay_delay: float = 0.25, relay_mode: str = 'bot'):
+        guild = StubGuild(members[:len(members) // 2])  # half the players resolve to members
+        self.chat_channels_obj = channels if channels is not None else [RecordingChannel()]
+        self.chat_channels = [chan.id for chan in self.chat_channels_obj]
+        self.chat_dispatch = ChatDispatcher(self.chat_channels)
+        self.cache = SimpleNamespace(get_guild=lambda _: guild)
+        self.mentions = MentionIndex(self.cache)
+        self.cfg = {'local_ip': '127.0.0.1', 'default_rcon_password': ''}
+        self.games = {}
+        self.is_alive = True
+        self.is_game_running = True
+        self.exit_watcher = FakeExitWatcher()
+        self.rest = FakeRest(self.chat_channels_obj)
+        self.relay = RelayHub(self, relay_delay, relay_mode)
+        self.printed = 0
+
+    def bprint(self, text: str = ''):
+        self.printed += 1
+
+
+def server_instance(cls, bot, **attrs):
+    """A server object without running its __init__, which would start tasks and connect RCON."""
+    server = cls.__new__(cls)
+    server.bot = bot
+    server._repr = cls.__name__
+    server._alive = True
+    for name, value in attrs.items():
+        setattr(server, name, value)
+    return server
@@ -0,0 +1,428 @@
+"""Replay a captured server log through a server class's game-to-Discord relay, offline.
+
+The capture is fed at its original pace (scaled by --speed) down the same path the bot reads it from, into a server
+object wired to recording fake channels:
+
+  minecraft  a latest.log, appended to a temp file that MinecraftServer.read_server_log tails
+  docker     a `docker logs [-t]` dump, served by a fake Docker logs endpoint to MinecraftDockerServer
+  source     a pcap of srcds UDP log packets (or a plain srcds log), sent to a SrcdsLogListener for SourceServer
+
+and reports line-written -> chan.send latency, send counts and how well lines were batched.
+
+    python -m tools.replay minecraft logs/latest.log --speed 20
+    python -m tools.replay source capture.pcap --port 22242 --speed 0 --send-delay 0.3
+    python -m tools.replay docker --synthetic 5000 --rate 200
+"""
+import argparse
+import asyncio
+import datetime
+import shutil
+import struct
+import tempfile
+import time
+from os import path
+from types import SimpleNamespace
+from typing import Dict, List, NamedTuple, Optional, Union
+
+import regex
+
+from tools import corpora
+from tools.fakes import FakeBot, RecordingChannel, server_instance
+from utils import logparse
+from utils.docker_logwatch import FRAME_HEADER
+from utils.relay import DISCORD_LIMIT
+from utils.srcds_log import PACKET_HEADER, PTYPE_LOG, SrcdsLogListener, payload_bounds
+
+MINECRAFT_CLOCK = regex.compile(r"^\[(?:\d{2}[A-Za-z]{3}\d{4} )?(\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,3}))?")
+DOCKER_TIMESTAMP = regex.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:?\d{2}) ")
+SOURCE_TIMESTAMP = regex.compile(r"^L (\d{2}/\d{2}/\d{4} - \d{2}:\d{2}:\d{2}):")
+
+# classic libpcap only; convert pcapng with `editcap -F pcap in.pcapng out.pcap`
+PCAP_MAGIC = {b'\xd4\xc3\xb2\xa1': ('<', 1e-6), b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+              b'\x4d\x3c\xb2\xa1': ('<', 1e-9), b'\xa1\xb2\x3c\x4d': ('>', 1e-9)}
+LINKTYPE_NULL, LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_SLL, LINKTYPE_IPV4, LINKTYPE_SLL2 = 0, 1, 101, 113, 228, 276
+
+
+class Record(NamedTuple):
+    at: float  # seconds since the first record
+    data: Union[str, bytes]  # a log line, or a srcds UDP payload
+    relayable: bool
+
+
+# -- reading captures ------------------------------------------------------------------------------------------------
+
+def _relative(stamps: List[Optional[float]]) -> List[float]:
+    """Fill in lines without a timestamp from the line before, and make everything relative to the first."""
+    out = []
+    last = next((s for s in stamps if s is not None), 0.0)
+    for stamp in stamps:
+        last = stamp if stamp is not None else last
+        out.append(last)
+    first = out[0] if out else 0.0
+    return [s - first for s in out]
+
+
+def _clock_seconds(lines: List[str]) -> List[Optional[float]]:
+    # Minecraft only logs the time of day, so count midnights as the clock goes backwards
+    stamps = []
+    day = 0
+    previous = None
+    for line in lines:
+        m = MINECRAFT_CLOCK.match(line)
+        if m is None:
+            stamps.append(None)
+            continue
+        seconds = int(m[1]) * 3600 + int(m[2]) * 60 + int(m[3]) + int((m[4] or '0').ljust(3, '0')) / 1000
+        if previous is not None and seconds < previous - 3600:
+            day += 1
+        previous = seconds
+        stamps.append(day * 86400 + seconds)
+    return stamps
+
+
+def read_lines(file_path: str) -> List[str]:
+    with open(file_path, 'rb') as f:
+        return [raw.rstrip(b'\r\n').decode('utf-8', errors='replace') for raw in f]
+
+
+def minecraft_records(lines: List[str]) -> List[Record]:
+    return [Record(at, line, logparse.classify_minecraft(line) is not None)
+            for at, line in zip(_relative(_clock_seconds(lines)), lines)]
+
+
+def docker_records(lines: List[str]) -> List[Record]:
+    """`docker logs -t` lines carry the daemon's timestamp; without -t, fall back to the Minecraft clock."""
+    if not lines or DOCKER_TIMESTAMP.match(lines[0]) is None:
+        return minecraft_records(lines)
+    stamps = []
+    stripped = []
+    for line in lines:
+        m = DOCKER_TIMESTAMP.match(line)
+        if m is None:
+            stamps.append(None)
+            stripped.append(line)
+            continue
+        zone = '+00:00' if m[3] == 'Z' else m[3]
+        when = datetime.datetime.fromisoformat(m[1] + zone).timestamp()
+        stamps.append(when + float('0.' + (m[2] or '0')))
+        stripped.append(line[m.end():])
+    return [Record(at, line, logparse.classify_minecraft(line) is not None)
+            for at, line in zip(_relative(stamps), stripped)]
+
+
+def log_packet(line: str) -> bytes:
+    return PACKET_HEADER + bytes([PTYPE_LOG]) + line.encode() + b'\n\x00'
+
+
+def _packet_relayable(packet: bytes) -> bool:
+    bounds = payload_bounds(memoryview(packet))
+    if bounds is None:
+        return False
+    start, end, _ = bounds
+    return logparse.classify_source(str(packet[start:end], 'utf-8', 'replace').strip()) is not None
+
+
+def source_text_records(lines: List[str]) -> List[Record]:
+    stamps = []
+    for line in lines:
+        m = SOURCE_TIMESTAMP.match(line)
+        stamps.append(datetime.datetime.strptime(m[1], '%m/%d/%Y - %H:%M:%S').timestamp() if m else None)
+    packets = [log_packet(line) for line in lines]
+    return [Record(at, packet, _packet_relayable(packet)) for at, packet in zip(_relative(stamps), packets)]
+
+
+def _udp_payload(frame: bytes, linktype: int, port: Optional[int]) -> Optional[bytes]:
+    if linktype == LINKTYPE_ETHERNET:
+        offset, ethertype = 14, struct.unpack_from('>H', frame, 12)[0]
+        while ethertype in (0x8100, 0x88a8):  # VLAN tags
+            ethertype = struct.unpack_from('>H', frame, offset + 2)[0]
+            offset += 4
+    elif linktype == LINKTYPE_SLL:
+        offset, ethertype = 16, struct.unpack_from('>H', frame, 14)[0]
+    elif linktype == LINKTYPE_SLL2:
+        offset, ethertype = 20, struct.unpack_from('>H', frame, 0)[0]
+    elif linktype == LINKTYPE_NULL:
+        offset, ethertype = 4, 0x0800 if frame[:4] in (b'\x02\x00\x00\x00', b'\x00\x00\x00\x02') else 0x86dd
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        offset, ethertype = 0, 0x0800 if frame[0] >> 4 == 4 else 0x86dd
+    else:
+        raise ValueError(f"unsupported pcap link type {linktype}")
+
+    if ethertype == 0x0800:
+        if frame[offset + 9] != 17:
+            return None
+        offset += (frame[offset] & 0x0f) * 4
+    elif ethertype == 0x86dd:
+        if frame[offset + 6] != 17:
+            return None
+        offset += 40
+    else:
+        return None
+    _, dst_port, length = struct.unpack_from('>HHH', frame, offset)
+    if port is not None and dst_port != port:
+        return None
+    return frame[offset + 8:offset + length]
+
+
+def pcap_records(file_path: str, port: Optional[int] = None) -> List[Record]:
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    if data[:4] not in PCAP_MAGIC:
+        raise ValueError(f"{file_path} isn't a classic pcap file")
+    endian, unit = PCAP_MAGIC[data[:4]]
+    linktype = struct.unpack_from(endian + 'I', data, 20)[0]
+    record_header = struct.Struct(endian + 'IIII')
+    offset = 24
+    stamps, packets = [], []
+    while offset + record_header.size <= len(data):
+        seconds, fraction, captured, _ = record_header.unpack_from(data, offset)
+        offset += record_header.size
+        frame = data[offset:offset + captured]
+        offset += captured
+        try:
+            payload = _udp_payload(frame, linktype, port)
+        except (IndexError, struct.error):
+            continue  # truncated by the snaplen
+        if payload and payload.startswith(PACKET_HEADER):
+            stamps.append(seconds + fraction * unit)
+            packets.append(payload)
+    return [Record(at, packet, _packet_relayable(packet)) for at, packet in zip(_relative(stamps), packets)]
+
+
+def synthetic_records(kind: str, size: int, rate: float, mix: Optional[dict], seed: int) -> List[Record]:
+    if kind == 'source':
+        corpus = corpora.source_corpus(size, mix, seed)
+        return [Record(i / rate, log_packet(line), expected is not None) for i, (line, expected) in enumerate(corpus)]
+    corpus = corpora.minecraft_corpus(size, 'vanilla', mix, seed)
+    return [Record(i / rate, line, expected is not None) for i, (line, expected) in enumerate(corpus)]
+
+
+# -- measuring -------------------------------------------------------------------------------------------------------
+
+class RelayRecorder:
+    """Matches each relayed line to when it was written, per channel, by order: the relay never reorders lines."""
+
+    def __init__(self, channels: List[RecordingChannel]):
+        self.channels = channels
+        self.written: List[float] = []
+        self.latencies: Dict[int, List[float]] = {chan.id: [] for chan in channels}
+        self._cursor: Dict[int, int] = {chan.id: 0 for chan in channels}
+        self.last_send = 0.0
+        for chan in channels:
+            chan.on_send = self._on_send
+
+    def wrote(self, relayable: bool):
+        if relayable:
+            self.written.append(time.perf_counter())
+
+    def _on_send(self, chan: RecordingChannel):
+        sent_at, content, _ = chan.sent[-1]
+        self.last_send = sent_at
+        cursor = self._cursor[chan.id]
+        lines = content.count('\n') + 1
+        for written in self.written[cursor:cursor + lines]:
+            self.latencies[chan.id].append(sent_at - written)
+        self._cursor[chan.id] = cursor + lines
+
+    @property
+    def delivered(self) -> bool:
+        return all(cursor >= len(self.written) for cursor in self._cursor.values())
+
+    async def settle(self, timeout: float):
+        """Wait until every relayable line has been sent everywhere, or nothing was sent for `timeout` seconds."""
+        started = time.perf_counter()
+        while not self.delivered and time.perf_counter() - max(self.last_send, started) < timeout:
+            await asyncio.sleep(0.05)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def feed(records: List[Record], write, recorder: RelayRecorder, speed: float, max_gap: float):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    wall = 0.0
+    previous = 0.0
+    for i, record in enumerate(records):
+        if speed > 0:
+            wall += min(record.at - previous, max_gap) / speed
+            previous = record.at
+            delay = start + wall - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif i % 64 == 0:
+            await asyncio.sleep(0)  # let the relay run between bursts
+        recorder.wrote(record.relayable)
+        write(record.data)
+
+
+# -- wiring each server class ----------------------------------------------------------------------------------------
+
+async def replay_minecraft(records, bot, recorder, args):
+    from utils.servers.minecraft import MinecraftServer
+
+    tmp = tempfile.mkdtemp(prefix='replay-')
+    log_path = path.join(tmp, 'latest.log')
+    log = open(log_path, 'w', encoding='utf-8')
+    server = server_instance(MinecraftServer, bot, proc=SimpleNamespace(pid=0), working_dir=tmp)
+    relay = asyncio.create_task(server.read_server_log(log_path))
+    try:
+        await asyncio.sleep(0.2)  # the tailer starts from the end of the file
+
+        def write(line):
+            log.write(line + '\n')
+            log.flush()
+
+        await feed(records, write, recorder, args.speed, args.max_gap)
+        await recorder.settle(args.settle)
+    finally:
+        bot.exit_watcher.exit()
+        await _finish(relay)
+        log.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+async def replay_docker(records, bot, recorder, args):
+    from utils.servers.docker_minecraft import MinecraftDockerServer
+
+    tmp = tempfile.mkdtemp(prefix='replay-')
+    socket_path = path.join(tmp, 'docker.sock')
+    fed = asyncio.Event()
+
+    async def logs_endpoint(reader, writer):
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.multiplexed-stream\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+
+        def write(line):
+            payload = (line + '\n').encode()
+            frame = FRAME_HEADER.pack(1, len(payload)) + payload
+            writer.write(b'%x\r\n' % len(frame) + frame + b'\r\n')
+
+        try:
+            await feed(records, write, recorder, args.speed, args.max_gap)
+            await writer.drain()
+        finally:
+            fed.set()
+
+    endpoint = await asyncio.start_unix_server(logs_endpoint, socket_path)
+    container = SimpleNamespace(id='replay', attrs={'Config': {'Tty': False}})
+    server = server_instance(MinecraftDockerServer, bot, proc=container, docker_socket=socket_path,
+                             containers=SimpleNamespace(is_running=lambda _: True), _log_since=time.time())
+    relay = asyncio.create_task(server.read_server_log())
+    try:
+        await fed.wait()
+        await recorder.settle(args.settle)
+    finally:
+        server._alive = False
+        await _finish(relay)
+        endpoint.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+async def replay_source(records, bot, recorder, args):
+    from utils.servers.source import SourceServer
+
+    loop = asyncio.get_running_loop()
+    listener = SrcdsLogListener(loop, '127.0.0.1', 0)
+    buffer = listener.register(('127.0.0.1', 0), capacity=args.capacity)
+    await listener._binding
+    target = listener._transport.get_extra_info('sockname')
+    sender, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=target)
+    bot.games['27015'] = 'Source'
+    server = server_instance(SourceServer, bot, log=buffer, port=27015)
+    relay = asyncio.create_task(server.chat_from_game_to_guild())
+    try:
+        await feed(records, sender.sendto, recorder, args.speed, args.max_gap)
+        await recorder.settle(args.settle)
+    finally:
+        bot.is_game_running = False
+        await _finish(relay)
+        sender.close()
+        listener.unregister(buffer)
+    print(f"log buffer: {buffer.received} received, {buffer.dropped} dropped, {listener.unrouted} unrouted")
+
+
+async def _finish(task: asyncio.Task):
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+
+
+REPLAYERS = {'minecraft': replay_minecraft, 'docker': replay_docker, 'source': replay_source}
+
+
+def load(args) -> List[Record]:
+    if args.synthetic:
+        return synthetic_records(args.kind, args.synthetic, args.rate, args.mix, args.seed)
+    if args.capture is None:
+        raise SystemExit("give a capture file or --synthetic LINES")
+    if args.kind == 'source':
+        with open(args.capture, 'rb') as f:
+            is_pcap = f.read(4) in PCAP_MAGIC
+        return pcap_records(args.capture, args.port) if is_pcap else source_text_records(read_lines(args.capture))
+    lines = read_lines(args.capture)
+    return docker_records(lines) if args.kind == 'docker' else minecraft_records(lines)
+
+
+def report(records: List[Record], bot: FakeBot, recorder: RelayRecorder, elapsed: float):
+    relayable = sum(r.relayable for r in records)
+    print(f"replayed {len(records)} lines ({relayable} relayable) in {elapsed:.2f}s, "
+          f"capture spans {records[-1].at if records else 0:.1f}s")
+    for chan in bot.chat_channels_obj:
+        sends = chan.sent
+        lines = sum(content.count('\n') + 1 for _, content, _ in sends)
+        longest = max((len(content) for _, content, _ in sends), default=0)
+        too_long = sum(len(content) > DISCORD_LIMIT for _, content, _ in sends)
+        by_webhook = sum('webhook' in kwargs for _, _, kwargs in sends)
+        print(f"channel {chan.id}: {len(sends)} sends ({by_webhook} by webhook) for {lines} lines "
+              f"({lines / len(sends) if sends else 0:.2f} lines/send), longest {longest} chars, "
+              f"{too_long} over Discord's {DISCORD_LIMIT}")
+        latencies = recorder.latencies[chan.id]
+        if latencies:
+            print("  latency ms  " + "  ".join(f"p{p}={percentile(latencies, p) * 1000:.1f}" for p in (50, 90, 99))
+                  + f"  max={max(latencies) * 1000:.1f}")
+        if len(latencies) < relayable:
+            print(f"  {relayable - len(latencies)} relayable line(s) never sent")
+        if chan.id in bot.relay.channels:
+            print(f"  {bot.relay.channels[chan.id]}")
+
+
+async def run(args):
+    records = load(args)
+    channels = [RecordingChannel(100 + i, guild_id=1 + i, send_delay=args.send_delay) for i in range(args.channels)]
+    bot = FakeBot(channels, relay_delay=args.flush_delay, relay_mode=args.relay_mode)
+    recorder = RelayRecorder(channels)
+    started = time.perf_counter()
+    await REPLAYERS[args.kind](records, bot, recorder, args)
+    report(records, bot, recorder, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('kind', choices=sorted(REPLAYERS))
+    parser.add_argument('capture', nargs='?', help="latest.log, docker logs dump, or srcds pcap/log")
+    parser.add_argument('--speed', type=float, default=1.0, help="1 is the original pace, 0 as fast as possible")
+    parser.add_argument('--max-gap', type=float, default=5.0, help="cap on idle gaps in the capture, in seconds")
+    parser.add_argument('--channels', type=int, default=1, help="how many bridged chat channels")
+    parser.add_argument('--send-delay', type=float, default=0.0, help="seconds each chan.send takes")
+    parser.add_argument('--flush-delay', type=float, default=0.25, help="relay queue deadline, in seconds")
+    parser.add_argument('--relay-mode', choices=('bot', 'webhook'), default='bot')
+    parser.add_argument('--settle', type=float, default=5.0, help="seconds to wait for the relay to catch up")
+    parser.add_argument('--port', type=int, help="pcap only: keep packets sent to this UDP port")
+    parser.add_argument('--capacity', type=int, default=1024, help="source only: log ring buffer size")
+    parser.add_argument('--synthetic', type=int, metavar='LINES', help="replay a generated capture instead")
+    parser.add_argument('--rate', type=float, default=50.0, help="synthetic lines per second")
+    parser.add_argument('--mix', type=corpora.parse_mix, default=None, help="synthetic kind weights")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import psutil
+from docker.models.containers import Container
+
+from utils.servers.base import BaseServer
+
+
+class ServerIdentity(NamedTuple):
+    kind: str  # 'process' or 'container'
+    key: Union[int, str]  # pid or container id
+    port: int
+
+
+def identify(port, server: Union[psutil.Process, Container]) -> ServerIdentity:
+    if isinstance(server, Container):
+        return ServerIdentity('container', server.id, int(port))
+    return ServerIdentity('process', server.pid, int(port))
+
+
+class DiscoveryState:
+    """Running servers keyed by identity, diffed against each sensor tick.
+
+    Each process/container is tracked once, under its lowest game port, so a container publishing
+    several game ports doesn't get one server object per port.
+    """
+
+    def __init__(self):
+        self.known: Dict[ServerIdentity, Optional[BaseServer]] = {}
+        self._by_key: Dict[Tuple[str, Union[int, str]], ServerIdentity] = {}
+
+    def update(self, running: List[Tuple[int, Union[psutil.Process, Container]]]) \
+            -> Tuple[List[Tuple[ServerIdentity, Union[psutil.Process, Container]]], List[ServerIdentity]]:
+        current: Dict[Tuple[str, Union[int, str]], Tuple[ServerIdentity, Union[psutil.Process, Container]]] = {}
+        for port, server in running:
+            identity = identify(port, server)
+            key = (identity.kind, identity.key)
+            if key not in current or identity.port < current[key][0].port:
+                current[key] = (identity, server)
+
+        added = [current[key] for key in current.keys() - self._by_key.keys()]
+        removed = [self._by_key[key] for key in self._by_key.keys() - current.keys()]
+
+        # removed identities stay known until the caller forgets them, so it can still tear their servers down
+        for identity, _ in added:
+            self.known[identity] = None
+            self._by_key[(identity.kind, identity.key)] = identity
+        return added, removed
+
+    def forget(self, identity: ServerIdentity) -> Optional[BaseServer]:
+        self._by_key.pop((identity.kind, identity.key), None)
+        return self.known.pop(identity, None)
+
+    def __bool__(self):
+        return bool(self.known)
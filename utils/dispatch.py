@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+import hikari
+
+_CLOSED = None  # queued to a consumer to tell it to stop
+
+
+class ChatDispatcher:
+    """Fans guild chat out to the game servers: the single GuildMessageCreateEvent listener classifies a message
+    once and it's put on a bounded queue per registered server. When a queue is full its oldest message is dropped
+    and counted, so a stuck server can't hold up the others or grow without bound.
+    """
+
+    def __init__(self, chat_channels: Iterable[int], maxsize: int = 64):
+        self.chat_channels = frozenset(int(chan) for chan in chat_channels)
+        self.maxsize = maxsize
+        self.queues: Dict[int, asyncio.Queue] = {}
+        self.dispatched = 0
+        self.dropped = 0
+
+    def is_chat(self, event: hikari.GuildMessageCreateEvent) -> bool:
+        return event.channel_id in self.chat_channels and not event.author.is_bot
+
+    def register(self, consumer) -> asyncio.Queue:
+        queue = self.queues.get(id(consumer))
+        if queue is None:
+            queue = self.queues[id(consumer)] = asyncio.Queue(self.maxsize)
+        return queue
+
+    def unregister(self, consumer):
+        queue = self.queues.pop(id(consumer), None)
+        if queue is not None:
+            self._put(queue, _CLOSED)
+
+    def _put(self, queue: asyncio.Queue, item: Optional[hikari.GuildMessageCreateEvent]):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(item)
+
+    def dispatch(self, event: hikari.GuildMessageCreateEvent) -> bool:
+        """Queues the message for every registered server if it's chat; returns whether it was."""
+        if not self.is_chat(event):
+            return False
+        for queue in self.queues.values():
+            if queue.full():
+                logging.warning(f"Guild2Game queue full, dropping the oldest message (dropped={self.dropped + 1})")
+            self._put(queue, event)
+        self.dispatched += 1
+        return True
+
+    def close(self):
+        for consumer in list(self.queues):
+            self._put(self.queues.pop(consumer), _CLOSED)
+
+    def __repr__(self):
+        return (f"ChatDispatcher(servers={len(self.queues)} dispatched={self.dispatched} dropped={self.dropped} "
+                f"queued={[queue.qsize() for queue in self.queues.values()]})")
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+import docker.errors
+import requests.exceptions
+from docker import DockerClient
+from docker.models.containers import Container
+
+# container actions that change whether a game could be running inside
+START_ACTIONS = {'start', 'unpause'}
+STOP_ACTIONS = {'die', 'stop', 'kill', 'pause', 'destroy'}
+
+
+class ContainerRegistry:
+    """In-memory view of running containers, kept current from the Docker /events stream.
+
+    Also the per-bot container state tracker: server objects read `is_running` from here instead of
+    inspecting their container, and await `stopped` instead of polling it.
+    """
+
+    def __init__(self, client: DockerClient, loop: asyncio.AbstractEventLoop):
+        self.client = client
+        self.loop = loop
+        self.running: Dict[str, Container] = {}
+        self.changed = asyncio.Event()
+        self.synced = False
+        self._stopped: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stream = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._watch, name="docker-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception as e:
+                logging.debug(e)
+
+    def containers(self) -> List[Container]:
+        with self._lock:
+            return list(self.running.values())
+
+    def is_running(self, container_id: str) -> bool:
+        # until the first sync nothing is known; assume running and let `stopped` settle it
+        return not self.synced or container_id in self.running
+
+    def stopped(self, container_id: str) -> asyncio.Future:
+        """Future resolved once the container stops. Must be called from the event loop."""
+        fut = self._stopped.get(container_id)
+        if fut is None:
+            fut = self.loop.create_future()
+            self._stopped[container_id] = fut
+            if not self.is_running(container_id):
+                self._resolve_stopped(container_id)
+        return fut
+
+    async def wait_for_change(self, timeout: float):
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.changed.clear()
+
+    def _watch(self):
+        backoff = 1
+        while not self._stopping:
+            try:
+                # subscribe from just before the resync so nothing between the two is lost
+                since = int(time.time())
+                self._resync()
+                self._stream = self.client.events(decode=True, since=since,
+                                                  filters={'type': 'container',
+                                                           'event': list(START_ACTIONS | STOP_ACTIONS)
+                                                           + ['health_status']})
+                backoff = 1
+                for event in self._stream:
+                    self._handle(event)
+            except (docker.errors.DockerException, requests.exceptions.RequestException) as e:
+                logging.error(f"Docker event stream failed: {e}")
+            except Exception as e:
+                logging.critical(e, exc_info=True)
+            self.synced = False
+            if self._stopping:
+                break
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def _resync(self):
+        result = self.client.containers.list(filters={'status': 'running'})
+        with self._lock:
+            gone = self.running.keys() - {container.id for container in result}
+            self.running = {container.id: container for container in result}
+        self.synced = True
+        for container_id in gone:
+            self._notify_stopped(container_id)
+        self._notify()
+        # anything watched before the first sync may never have been running at all
+        self._call_soon(self._resolve_missing)
+
+    def _handle(self, event: dict):
+        action = event.get('Action') or event.get('status') or ''
+        container_id = event.get('id') or event.get('Actor', {}).get('ID')
+        if not container_id:
+            return
+        if action in START_ACTIONS or action.startswith('health_status'):
+            try:
+                container = self.client.containers.get(container_id)
+            except docker.errors.NotFound:
+                return
+            with self._lock:
+                if container.status == 'running':
+                    self.running[container_id] = container
+                else:
+                    self.running.pop(container_id, None)
+            if container.status != 'running':
+                self._notify_stopped(container_id)
+        elif action in STOP_ACTIONS:
+            with self._lock:
+                if self.running.pop(container_id, None) is None:
+                    return
+            self._notify_stopped(container_id)
+        else:
+            return
+        logging.debug(f"Docker event: {action} {container_id}")
+        self._notify()
+
+    def _notify(self):
+        self._call_soon(self.changed.set)
+
+    def _notify_stopped(self, container_id: str):
+        self._call_soon(self._resolve_stopped, container_id)
+
+    def _call_soon(self, callback, *args):
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:  # event loop already closed
+            self._stopping = True
+
+    def _resolve_stopped(self, container_id: str):
+        fut = self._stopped.pop(container_id, None)
+        if fut is not None and not fut.done():
+            fut.set_result(container_id)
+
+    def _resolve_missing(self):
+        for container_id in [c for c in self._stopped if not self.is_running(c)]:
+            self._resolve_stopped(container_id)
@@ -1,16 +1,146 @@
-import sys
+import asyncio
+import logging
+import struct
+import time
+from typing import AsyncIterator, List, Optional
+from urllib.parse import urlencode
 
-import docker
-from docker.models.containers import Container
+DOCKER_SOCKET = '/var/run/docker.sock'
+# stdcopy frame header: stream type (1 byte), 3 bytes padding, payload length (big-endian uint32)
+FRAME_HEADER = struct.Struct('>BxxxL')
 
-dock = docker.from_env()
 
+class DockerLogError(Exception):
+    pass
 
-def wait_or_when_cancelled(id):
-    con: Container = dock.containers.get(id)
-    log = con.attach(stdout=True, stream=True, logs=False)
-    while True:
-        print(log.next(), file=sys.stdout)
 
+class DockerLogStream:
+    """Follows a container's output over the Docker logs endpoint on the unix socket.
 
-wait_or_when_cancelled(sys.argv[1])
+    The multiplexed stdout/stderr frames are demuxed in-process and only complete lines are yielded, either one
+    at a time (``async for line in stream``) or in the batches they arrived in (``stream.batches()``).
+    """
+
+    def __init__(self, container_id: str, socket_path: str = DOCKER_SOCKET, since: Optional[float] = None,
+                 tail: int = 0, tty: Optional[bool] = None, max_line: int = 16384):
+        self.container_id = container_id
+        self.socket_path = socket_path
+        self.since = since if since is not None else time.time()
+        self.tail = tail
+        self.tty = tty  # a tty container's output isn't framed; None means work it out from the response
+        self.max_line = max_line
+        self.last_received = self.since
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._chunked = False
+
+    async def open(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        query = urlencode({'follow': 1, 'stdout': 1, 'stderr': 1, 'tail': self.tail, 'since': f"{self.since:.9f}"})
+        self._writer.write(f"GET /containers/{self.container_id}/logs?{query} HTTP/1.1\r\n"
+                           f"Host: docker\r\nAccept: */*\r\n\r\n".encode())
+        await self._writer.drain()
+
+        status = (await self._reader.readline()).decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip().lower()
+        if len(status) < 2 or status[1] != '200':
+            raise DockerLogError(f"docker logs for {self.container_id} returned {' '.join(status).strip()}")
+
+        self._chunked = 'chunked' in headers.get('transfer-encoding', '')
+        content_type = headers.get('content-type', '')
+        if self.tty is None and 'multiplexed-stream' in content_type:
+            self.tty = False
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self._writer = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _body(self) -> AsyncIterator[bytes]:
+        while True:
+            if self._chunked:
+                size_line = await self._reader.readline()
+                if not size_line:
+                    return
+                size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    return
+                data = await self._reader.readexactly(size)
+                await self._reader.readline()  # CRLF after each chunk
+            else:
+                data = await self._reader.read(65536)
+                if not data:
+                    return
+            yield data
+
+    async def _payloads(self) -> AsyncIterator[bytes]:
+        pending = bytearray()
+        async for data in self._body():
+            if self.tty is None:
+                # old daemons don't say which they're sending; frames always start with 0-2 and three zero bytes
+                self.tty = not (data[:1] in (b'\x00', b'\x01', b'\x02') and data[1:4] == b'\x00\x00\x00')
+            if self.tty:
+                yield data
+                continue
+            pending += data
+            out = bytearray()
+            offset = 0
+            while len(pending) - offset >= FRAME_HEADER.size:
+                _, length = FRAME_HEADER.unpack_from(pending, offset)
+                end = offset + FRAME_HEADER.size + length
+                if end > len(pending):
+                    break
+                out += pending[offset + FRAME_HEADER.size:end]
+                offset = end
+            del pending[:offset]
+            if out:
+                yield bytes(out)
+
+    async def batches(self) -> AsyncIterator[List[str]]:
+        if self._reader is None:
+            await self.open()
+        partial = bytearray()
+        truncated = False
+        async for payload in self._payloads():
+            self.last_received = time.time()
+            partial += payload
+            *complete, rest = partial.split(b'\n')
+            partial = bytearray(rest)
+            lines = []
+            for raw in complete:
+                if truncated:  # tail end of an oversized line that was already emitted
+                    truncated = False
+                    continue
+                lines.append(raw[:self.max_line].rstrip(b'\r').decode('utf-8', errors='replace'))
+            if truncated:
+                partial.clear()
+            elif len(partial) > self.max_line:
+                # bounded buffer: emit what fits and drop the rest of the line
+                lines.append(partial[:self.max_line].decode('utf-8', errors='replace'))
+                logging.debug(f"Truncated a {len(partial)}+ byte log line from {self.container_id}")
+                partial.clear()
+                truncated = True
+            if lines:
+                yield lines
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async for lines in self.batches():
+            for line in lines:
+                yield line
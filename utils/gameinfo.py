@@ -0,0 +1,126 @@
+import csv
+import logging
+import os
+import re
+from os import path
+from typing import Dict, Optional, Tuple
+
+import toml
+
+StatKey = Tuple[int, int]  # (mtime_ns, size)
+
+
+def stat_key(file_path: str) -> Optional[StatKey]:
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class MetadataCache:
+    """Parsed .gameinfo.toml and LGSM metadata, keyed by root directory and revalidated by (mtime, size)."""
+
+    def __init__(self):
+        self._gameinfo: Dict[str, Tuple[StatKey, dict]] = {}
+        self._lgsm: Dict[str, Tuple[tuple, dict]] = {}
+        self._serverlists: Dict[str, Tuple[StatKey, Dict[str, str]]] = {}
+
+    def game_info(self, root: str, defaults: dict) -> dict:
+        """Merge the stored .gameinfo.toml over `defaults`, writing back only when defaults add new keys."""
+        toml_path = path.join(root, '.gameinfo.toml')
+        stored = self._load_gameinfo(toml_path)
+        if stored is None:
+            print(f"created new gameinfo file at {toml_path}")
+            self._write_gameinfo(toml_path, defaults)
+            return dict(defaults)
+
+        game_info = {**defaults, **stored}
+        if defaults.keys() - stored.keys():
+            self._write_gameinfo(toml_path, game_info)
+        return game_info
+
+    def _load_gameinfo(self, toml_path: str) -> Optional[dict]:
+        key = stat_key(toml_path)
+        if key is None:
+            self._gameinfo.pop(toml_path, None)
+            return None
+        cached = self._gameinfo.get(toml_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            with open(toml_path) as file:
+                stored = toml.load(file)
+        except toml.TomlDecodeError as e:
+            print(f"TOML decoding error | {e}")
+            raise
+        self._gameinfo[toml_path] = (key, stored)
+        return stored
+
+    def _write_gameinfo(self, toml_path: str, game_info: dict):
+        try:
+            with open(toml_path, "w") as file:
+                toml.dump(game_info, file)
+        except Exception as e:
+            print(f"Exception {type(e)}: {e}")
+            self._gameinfo.pop(toml_path, None)
+            return
+        key = stat_key(toml_path)
+        if key is not None:
+            self._gameinfo[toml_path] = (key, dict(game_info))
+
+    def lgsm_info(self, root: str) -> dict:
+        """Game script name, readable name and rcon password of the LGSM install at `root`."""
+        lgsm_dir = path.join(root, 'lgsm')
+        serverlist_path = path.join(lgsm_dir, 'data', 'serverlist.csv')
+        cached = self._lgsm.get(root)
+        if cached:
+            game_name = cached[1]['game']
+            key = (stat_key(root), stat_key(self._cfg_path(root, game_name)), stat_key(serverlist_path))
+            if cached[0] == key:
+                return cached[1]
+
+        game_name = ""
+        with os.scandir(root) as scan:
+            for f in scan:
+                if f.name.endswith('server'):
+                    game_name = f.name
+                    break
+        cfg_path = self._cfg_path(root, game_name)
+
+        rcon_password = ''
+        try:
+            with open(cfg_path) as f:
+                game_cfg = toml.load(f)
+            rcon_password = next((v for k, v in game_cfg.items() if re.match("rcon.?pa", k, re.I)), '')
+        except (toml.TomlDecodeError, OSError) as e:
+            print(f"File {cfg_path} failed to parse.")
+            print(e)
+
+        info = {'game': game_name,
+                'name': self.serverlist(serverlist_path).get(game_name, ''),
+                'configs': path.dirname(cfg_path),
+                'rcon_password': rcon_password}
+        self._lgsm[root] = ((stat_key(root), stat_key(cfg_path), stat_key(serverlist_path)), info)
+        return info
+
+    def serverlist(self, serverlist_path: str) -> Dict[str, str]:
+        """LGSM's serverlist.csv as {game script name: readable name}."""
+        key = stat_key(serverlist_path)
+        cached = self._serverlists.get(serverlist_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        names = {}
+        try:
+            with open(serverlist_path) as svr_names:
+                for row in csv.reader(svr_names, csv.unix_dialect):
+                    if len(row) > 2:
+                        names[row[1]] = row[2]
+        except OSError as e:
+            logging.error(e)
+        self._serverlists[serverlist_path] = (key, names)
+        return names
+
+    @staticmethod
+    def _cfg_path(root: str, game_name: str) -> str:
+        return path.join(root, 'lgsm', 'config-lgsm', game_name, f'{game_name}.cfg')
@@ -0,0 +1,108 @@
+from typing import NamedTuple, Optional
+
+import regex
+
+CHAT = 'chat'
+JOIN = 'join'
+LEAVE = 'leave'
+DEATH = 'death'
+ADVANCEMENT = 'advancement'
+SERVER = 'server'  # command feedback, e.g. "[Rcon: Saved the game]"
+
+SKULL = '\N{SKULL}'
+
+
+class LogEvent(NamedTuple):
+    kind: str
+    text: str  # what gets relayed, before markup and mention resolution
+    player: str = ''
+    body: str = ''  # chat only: the message without the speaker
+    team: bool = False
+
+
+# Every Minecraft line worth relaying is logged at INFO, in any of
+#   vanilla: [12:00:00] [Server thread/INFO]: <Steve> hi
+#   paper:   [12:00:00 INFO]: <Steve> hi
+#   forge:   [12:00:00] [Server thread/INFO] [minecraft/DedicatedServer]: <Steve> hi
+MINECRAFT_PREFILTER = 'INFO]'
+MINECRAFT_DEATHS = (r"died|drowned|blew up|fell|burned|froze|starved|suffocated|withered|walked into a cactus"
+                    r"|experienced kinetic energy|discovered (?:the )?floor was lava|tried to swim in lava"
+                    r"|hit the ground|didn't want to live|went (?:up in flames|off with a bang)"
+                    r"|walked into (?:fire|danger)|was (?:killed|shot|slain|pummeled|pricked|blown up|impaled"
+                    r"|squashed|squished|skewered|poked|roasted|burnt|frozen|struck by lightning|fireballed|stung"
+                    r"|doomed)")
+MINECRAFT_PREFIX = r"INFO\]:?(?:.*tedServer\]:)? "
+# tried in this order at the position just after the prefix; first match wins
+MINECRAFT_PATTERNS = {
+    CHAT: r"(?P<chat>\[Server\]\s?(?P<server_body>.*)|<(?P<chat_player>[^>]*)>\s?(?P<chat_body>.*)"
+          r"|\*\s(?P<emote_player>\S+)\s(?P<emote_body>.*))",
+    SERVER: r"(?P<server>\[[^\]]*: .*\].*)",
+    JOIN: r"(?P<join>(?P<join_player>\w+) joined the game)",
+    LEAVE: r"(?P<leave>(?P<leave_player>\w+) left the game)",
+    ADVANCEMENT: r"(?P<advancement>(?P<adv_player>\w+) has (?:made|completed|reached) the .*)",
+    DEATH: r"(?P<death>(?P<death_player>\w+) (?P<death_cause>" + MINECRAFT_DEATHS + r")(?:\s(?P<death_rest>.*))?)",
+}
+MINECRAFT_LINE = regex.compile(MINECRAFT_PREFIX + "(?:" + "|".join(MINECRAFT_PATTERNS.values()) + ")")
+
+# srcds, e.g.
+#   L 10/18/2026 - 12:00:00: "Steve<2><[U:1:123]><Red>" say "hi"
+#   L 10/18/2026 - 12:00:00: "Steve<2><[U:1:123]><>" connected, address "10.0.0.2:27005"
+#   L 10/18/2026 - 12:00:00: "Steve<2><[U:1:123]><Red>" disconnected (reason "Disconnect by user.")
+SOURCE_PREFILTER = ('say', 'connected')
+SOURCE_PREFILTER_BYTES = tuple(word.encode() for word in SOURCE_PREFILTER)
+SOURCE_PREFIX = r"""(?<=: ")(?P<player>[\w\s]+)(?P<ids><\d+><(?:STEAM_0:\d:\d+|Console|\[U:\d:\d+\])><[^>]*>)" """
+SOURCE_PATTERNS = {
+    CHAT: r"""(?P<say>say|say_team) "(?!\|D> )(?P<msg>.*)\"""",
+    'connection': r"""(?P<conn>(?:dis)?connected),? """
+                  r"""(?:address "(?P<addr>\d{1,3}(?:\.\d{1,3}){3}:\d{2,5})"|(?P<reason>\(reason ".+"?))""",
+}
+SOURCE_LINE = regex.compile(SOURCE_PREFIX + "(?:" + "|".join(SOURCE_PATTERNS.values()) + ")")
+
+
+def classify_minecraft(line: str) -> Optional[LogEvent]:
+    if MINECRAFT_PREFILTER not in line:
+        return None
+    m = MINECRAFT_LINE.search(line)
+    if m is None:
+        return None
+    if m['chat'] is not None:
+        player = m['chat_player'] or m['emote_player'] or 'Server'
+        body = next(b for b in (m['chat_body'], m['emote_body'], m['server_body']) if b is not None)
+        return LogEvent(CHAT, m['chat'].rstrip(), player, body.rstrip())
+    if m['server'] is not None:
+        return LogEvent(SERVER, m['server'].rstrip())
+    if m['join'] is not None:
+        return LogEvent(JOIN, m['join'], m['join_player'])
+    if m['leave'] is not None:
+        return LogEvent(LEAVE, m['leave'], m['leave_player'])
+    if m['advancement'] is not None:
+        return LogEvent(ADVANCEMENT, m['advancement'].rstrip(), m['adv_player'])
+    parts = (m['death_player'], m['death_cause'], (m['death_rest'] or '').rstrip())
+    return LogEvent(DEATH, ' '.join(p for p in parts if p), m['death_player'])
+
+
+def source_prefilter(line: str) -> bool:
+    return any(word in line for word in SOURCE_PREFILTER)
+
+
+def classify_source(line: str) -> Optional[LogEvent]:
+    if not source_prefilter(line):
+        return None
+    m = SOURCE_LINE.search(line)
+    if m is None:
+        return None
+    player = m['player']
+    if m['say'] is not None:
+        team = m['say'] == 'say_team'
+        return LogEvent(CHAT, f"{'[TEAM] ' if team else ''}*[{player}]*: {m['msg']}", player, m['msg'], team)
+    text = ' '.join(p for p in (player, m['ids'], m['conn'], m['addr'] or m['reason']) if p)
+    return LogEvent(JOIN if m['conn'] == 'connected' else LEAVE, text, player)
+
+
+def relay_text(event: LogEvent) -> str:
+    """Discord markup for a non-chat event; chat text goes through mention resolution instead."""
+    if event.kind == CHAT:
+        return event.text
+    if event.kind == DEATH:
+        return f'{SKULL} {event.text} {SKULL}'
+    return f'`{event.text}`'
@@ -0,0 +1,128 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import hikari
+
+MAX_NAME = 32  # longest username or nickname Discord allows
+_END = ''  # key of a node's owners; never a real edge, since every edge is one character
+
+
+class MemberTrie:
+    """Case-folded prefix tree over one guild's usernames and nicknames."""
+
+    def __init__(self):
+        self._root: dict = {}
+        self._names: Dict[int, Tuple[str, ...]] = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    @staticmethod
+    def _names_of(member) -> Tuple[str, ...]:
+        names = {name.casefold() for name in (member.username, getattr(member, 'nickname', None)) if name}
+        return tuple(names)
+
+    def add(self, member):
+        member_id = int(member.id)
+        if member_id in self._names:
+            self.remove(member_id)
+        names = self._names_of(member)
+        self._names[member_id] = names
+        for name in names:
+            node = self._root
+            for ch in name:
+                node = node.setdefault(ch, {})
+            node.setdefault(_END, []).append(member_id)
+
+    def remove(self, member_id: int):
+        for name in self._names.pop(int(member_id), ()):
+            path = [self._root]
+            for ch in name:
+                path.append(path[-1][ch])
+            owners = path[-1][_END]
+            owners.remove(int(member_id))
+            if not owners:
+                del path[-1][_END]
+            # prune the branch back to the last node something else still needs
+            for depth in range(len(name), 0, -1):
+                if path[depth]:
+                    break
+                del path[depth - 1][name[depth - 1]]
+
+    def longest_match(self, text: str, start: int = 0) -> Optional[Tuple[int, int]]:
+        """(member id, end index) of the longest name that `text[start:]` begins with, case-insensitively."""
+        node = self._root
+        best = None
+        for i in range(start, min(len(text), start + MAX_NAME)):
+            for ch in text[i].casefold():  # casefolding can expand a character, e.g. ß -> ss
+                node = node.get(ch)
+                if node is None:
+                    return best
+            if _END in node:
+                best = (node[_END][0], i + 1)
+        return best
+
+
+class MentionIndex:
+    """A MemberTrie per guild, built from the cache the first time the guild is needed and kept current from
+    member events, so resolving an @mention costs the length of the name rather than a scan of the guild."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.guilds: Dict[int, MemberTrie] = {}
+
+    def trie(self, guild_id: hikari.Snowflakeish) -> Optional[MemberTrie]:
+        guild_id = int(guild_id)
+        trie = self.guilds.get(guild_id)
+        if trie is None:
+            guild = self.cache.get_guild(guild_id)
+            if guild is None:
+                return None
+            trie = self.guilds[guild_id] = MemberTrie()
+            for member in guild.get_members().values():
+                trie.add(member)
+        return trie
+
+    def member_added(self, member):
+        trie = self.guilds.get(int(member.guild_id))
+        if trie is not None:  # guilds that haven't been indexed yet get built from the cache when first needed
+            trie.add(member)
+
+    def members_chunked(self, guild_id: hikari.Snowflakeish, members: Iterable):
+        """Adds a chunk of members, which may arrive after the guild's trie was built from a partial cache."""
+        trie = self.guilds.get(int(guild_id))
+        if trie is not None:
+            for member in members:
+                trie.add(member)
+
+    def member_removed(self, guild_id: hikari.Snowflakeish, user_id: hikari.Snowflakeish):
+        trie = self.guilds.get(int(guild_id))
+        if trie is not None:
+            trie.remove(int(user_id))
+
+    def forget_guild(self, guild_id: hikari.Snowflakeish):
+        self.guilds.pop(int(guild_id), None)
+
+    def resolve(self, message: str, guild_ids: Iterable[hikari.Snowflakeish]) -> Tuple[List[int], str]:
+        """Replaces each @name with a mention of the member with the longest matching name, looking in the
+        guilds in order. Returns the mentioned member ids and the new message."""
+        if '@' not in message:
+            return [], message
+        tries = [trie for trie in (self.trie(guild_id) for guild_id in guild_ids) if trie is not None]
+        mentioned = []
+        out = []
+        last = 0
+        at = message.find('@')
+        while at != -1:
+            match = next((m for m in (trie.longest_match(message, at + 1) for trie in tries) if m), None)
+            if match is None:
+                at = message.find('@', at + 1)
+                continue
+            member_id, end = match
+            out.append(message[last:at])
+            out.append(f"<@{member_id}>")
+            if member_id not in mentioned:
+                mentioned.append(member_id)
+            last = end
+            at = message.find('@', end)
+        out.append(message[last:])
+        return mentioned, ''.join(out)
@@ -0,0 +1,134 @@
+import json
+import textwrap as tw
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+import hikari
+import regex
+
+from utils.rcon import MAX_COMMAND, RconClient, RconOutbox
+
+DEFAULT_COLOUR = 'blue'  # what say mode's §9 renders as
+CUSTOM_EMOJI = regex.compile(r'<(:\w+:)\d+>')
+Component = Dict[str, Any]
+
+
+def clean_content(content: str) -> str:
+    return CUSTOM_EMOJI.sub(r'\1', content)
+
+
+def attachment_summary(attachments: Sequence[hikari.Attachment]) -> str:
+    """e.g. "sent a png, 2 jpgs and a txt"."""
+    counts = Counter(att.extension or 'file with no extension' for att in attachments)
+    ordered = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))  # most common first
+    files = [f"a {ext}" if n == 1 else f"{n} {ext}s" for ext, n in ordered]
+    return "sent " + (files[0] if len(files) == 1 else f"{', '.join(files[:-1])} and {files[-1]}")
+
+
+def say_lines(username: str, content: List[str]) -> List[str]:
+    """`say` lines for one message: the author's name before the first line, long lines wrapped at 90."""
+    lines = []
+    for index, line in enumerate(content):
+        prefix = f"§9§l{username}§r: " if index == 0 else ''
+        if len(prefix + line) >= 100:
+            lines += tw.wrap(line, 90, initial_indent=prefix)
+        else:
+            lines.append(prefix + line)
+    return lines
+
+
+def say_commands(msg: hikari.GuildMessageCreateEvent) -> List[str]:
+    lines = say_lines(msg.author.username, clean_content(msg.content).split('\n')) if msg.content else []
+    if msg.message.attachments:
+        lines += say_lines(msg.author.username, [f"§l[{attachment_summary(msg.message.attachments)}]"])
+    return [f"say {line}" for line in lines]
+
+
+def author_colour(member: Optional[hikari.Member]) -> str:
+    """The colour of the member's highest coloured role, as Discord shows their name."""
+    if member is not None:
+        for role in sorted(member.get_roles(), key=lambda r: r.position, reverse=True):
+            if role.color:
+                return role.color.hex_code
+    return DEFAULT_COLOUR
+
+
+def tellraw_message(msg: hikari.GuildMessageCreateEvent) -> List[Component]:
+    """Chat components for one Discord message: the author's name in their colour, the text with its newlines kept,
+    and a summary of any attachments."""
+    components = [{'text': msg.author.username, 'color': author_colour(msg.member), 'bold': True}, {'text': ': '}]
+    if msg.content:
+        components.append({'text': clean_content(msg.content)})
+    if msg.message.attachments:
+        components.append({'text': f"{' ' if msg.content else ''}[{attachment_summary(msg.message.attachments)}]",
+                           'color': 'gray', 'italic': True})
+    return components
+
+
+def _tellraw(components: List[Component]) -> str:
+    # the leading '' keeps the first component's style from carrying over to the rest
+    return 'tellraw @a ' + json.dumps([''] + components, ensure_ascii=False, separators=(',', ':'))
+
+
+def _size(command: str) -> int:
+    return len(command.encode('utf-8'))
+
+
+def _split_text(component: Component, budget: int) -> List[Component]:
+    """The component cut into pieces whose JSON-escaped text is at most `budget` bytes."""
+    pieces = []
+    start = used = 0
+    text = component['text']
+    for i, ch in enumerate(text):
+        cost = _size(json.dumps(ch, ensure_ascii=False)) - 2
+        if used + cost > budget and i > start:
+            pieces.append(dict(component, text=text[start:i]))
+            start, used = i, 0
+        used += cost
+    pieces.append(dict(component, text=text[start:]))
+    return pieces
+
+
+def _fit(components: List[Component]) -> List[List[Component]]:
+    """One message's components as one or more tellraw-sized groups, splitting its longest text if it must."""
+    if _size(_tellraw(components)) <= MAX_COMMAND:
+        return [components]
+    longest = max(range(len(components)), key=lambda i: len(components[i]['text']))
+    rest = components[:longest] + components[longest + 1:]
+    budget = MAX_COMMAND - _size(_tellraw(rest)) - len('{"text":""},')
+    head, *tail = _split_text(components[longest], max(budget, 64))
+    groups = [components[:longest] + [head]]
+    groups += [[piece] for piece in tail[:-1]]
+    groups.append(tail[-1:] + components[longest + 1:] if tail else components[longest + 1:])
+    return [group for group in groups if group]
+
+
+def tellraw_commands(messages: List[List[Component]]) -> List[str]:
+    """As few `tellraw @a` commands as fit the messages, one message per line."""
+    commands = []
+    parts: List[Component] = []
+    for message in messages:
+        for group in _fit(message):
+            candidate = parts + [{'text': '\n'}] + group if parts else group
+            if parts and _size(_tellraw(candidate)) > MAX_COMMAND:
+                commands.append(_tellraw(parts))
+                candidate = group
+            parts = candidate
+    if parts:
+        commands.append(_tellraw(parts))
+    return commands
+
+
+def chat_outbox(rcon: RconClient, cfg: dict, on_failure: Callable[[Hashable, Exception, int], None]) -> RconOutbox:
+    """The guild-to-game queue for a Minecraft server in the configured `minecraft_chat_mode`: 'say' sends every
+    line as its own command; 'tellraw' renders whole messages as JSON chat and coalesces those sent within
+    `minecraft_chat_delay` seconds into one command."""
+    if cfg.get('minecraft_chat_mode', 'say') == 'tellraw':
+        return RconOutbox(rcon, on_failure, render=tellraw_commands, delay=cfg.get('minecraft_chat_delay', 0.25))
+    return RconOutbox(rcon, on_failure)
+
+
+def chat_payload(msg: hikari.GuildMessageCreateEvent, cfg: dict) -> list:
+    if cfg.get('minecraft_chat_mode', 'say') == 'tellraw':
+        return tellraw_message(msg)
+    return say_commands(msg)
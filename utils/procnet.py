@@ -0,0 +1,152 @@
+import bisect
+import os
+from os import path
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+TCP_LISTEN = '0A'
+UDP_UNCONNECTED = '07'
+# (file under /proc/net, socket state that means "accepting traffic")
+PROC_NET_TABLES = (('tcp', TCP_LISTEN), ('tcp6', TCP_LISTEN), ('udp', UDP_UNCONNECTED), ('udp6', UDP_UNCONNECTED))
+
+
+def available(proc_root: str = '/proc') -> bool:
+    return path.exists(path.join(proc_root, 'net', 'tcp'))
+
+
+class PortRangeSet:
+    """`game_port_range` compiled into sorted, merged intervals.
+
+    Entries may be single ports, ``"27015-27020"`` strings or ``[start, end]`` pairs.
+    """
+
+    def __init__(self, spec: Iterable[Union[int, str, List[int], Tuple[int, int]]]):
+        intervals = []
+        for entry in spec:
+            if isinstance(entry, (list, tuple)):
+                start, end = int(entry[0]), int(entry[-1])
+            elif isinstance(entry, str) and '-' in entry:
+                start, end = (int(x) for x in entry.split('-', 1))
+            else:
+                start = end = int(entry)
+            intervals.append((min(start, end), max(start, end)))
+        intervals.sort()
+
+        merged: List[List[int]] = []
+        for start, end in intervals:
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self._starts = [start for start, _ in merged]
+        self._ends = [end for _, end in merged]
+
+    def __contains__(self, port) -> bool:
+        try:
+            port = int(port)
+        except (TypeError, ValueError):
+            return False
+        i = bisect.bisect_right(self._starts, port) - 1
+        return i >= 0 and port <= self._ends[i]
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    def __repr__(self):
+        return f"PortRangeSet({list(zip(self._starts, self._ends))})"
+
+
+def listening_sockets(proc_root: str = '/proc') -> Dict[int, Set[int]]:
+    """Map every listening TCP / bound UDP port on the host to its socket inodes."""
+    sockets: Dict[int, Set[int]] = {}
+    for table, state in PROC_NET_TABLES:
+        try:
+            with open(path.join(proc_root, 'net', table)) as f:
+                next(f, None)  # header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 10 or fields[3] != state:
+                        continue
+                    inode = int(fields[9])
+                    if not inode:
+                        continue
+                    port = int(fields[1].rsplit(':', 1)[1], 16)
+                    sockets.setdefault(port, set()).add(inode)
+        except FileNotFoundError:  # no ipv6, or not linux
+            continue
+    return sockets
+
+
+def _socket_inodes(proc_root: str, pid: str) -> Set[int]:
+    fd_dir = path.join(proc_root, pid, 'fd')
+    inodes = set()
+    try:
+        fds = os.listdir(fd_dir)
+    except OSError:  # gone, or not ours to look at
+        return inodes
+    for fd in fds:
+        try:
+            link = os.readlink(path.join(fd_dir, fd))
+        except OSError:
+            continue
+        if link.startswith('socket:['):
+            inodes.add(int(link[8:-1]))
+    return inodes
+
+
+class PortIndex:
+    """Port -> process index built from /proc/net once per scan.
+
+    Only sockets on ports inside `ports` are resolved to PIDs, and owners found on a previous scan are
+    re-checked first, so a steady state costs four table reads and a handful of readlinks.
+    """
+
+    def __init__(self, ports: Union[PortRangeSet, Iterable], proc_root: str = '/proc'):
+        self.ports = ports if isinstance(ports, PortRangeSet) else PortRangeSet(ports)
+        self.proc_root = proc_root
+        self._owners: Dict[int, int] = {}  # socket inode -> pid, from the last scan
+
+    def game_sockets(self) -> Dict[int, Set[int]]:
+        return {port: inodes for port, inodes in listening_sockets(self.proc_root).items() if port in self.ports}
+
+    def any_listening(self) -> bool:
+        return bool(self.game_sockets())
+
+    def scan(self) -> List[Tuple[int, int]]:
+        """Return (port, pid) for each process listening in the game port range, lowest port per process."""
+        sockets = self.game_sockets()
+        wanted = {inode for inodes in sockets.values() for inode in inodes}
+        owners = self._resolve(wanted)
+
+        result = []
+        seen = set()
+        for port in sorted(sockets):
+            for inode in sockets[port]:
+                pid = owners.get(inode)
+                if pid is not None and pid not in seen:
+                    result.append((port, pid))
+                    seen.add(pid)
+        return result
+
+    def _resolve(self, wanted: Set[int]) -> Dict[int, int]:
+        owners: Dict[int, int] = {}
+        remaining = set(wanted)
+
+        for pid in {pid for inode, pid in self._owners.items() if inode in remaining}:
+            found = _socket_inodes(self.proc_root, str(pid)) & remaining
+            for inode in found:
+                owners[inode] = pid
+            remaining -= found
+
+        if remaining:
+            for entry in os.listdir(self.proc_root):
+                if not entry.isdigit():
+                    continue
+                found = _socket_inodes(self.proc_root, entry) & remaining
+                for inode in found:
+                    owners[inode] = int(entry)
+                remaining -= found
+                if not remaining:
+                    break
+
+        self._owners = owners
+        return owners
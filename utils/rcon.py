@@ -0,0 +1,354 @@
+import asyncio
+import collections
+import itertools
+import logging
+import struct
+import time
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from utils.relay import DeliveryStats
+
+# Source RCON packet types; Minecraft speaks the same protocol
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+MAX_COMMAND = 1446  # longest body Minecraft accepts; srcds takes more
+MAX_PACKET = 4110  # longest packet either game sends: 4096 bytes of body plus the header and terminators
+
+
+class RconError(Exception):
+    pass
+
+
+class RconAuthError(RconError):
+    pass
+
+
+class RconConnectionError(RconError, ConnectionError):
+    pass
+
+
+class RconTimeoutError(RconError, asyncio.TimeoutError):
+    pass
+
+
+def encode_packet(request_id: int, packet_type: int, body: str) -> bytes:
+    payload = struct.pack('<ii', request_id, packet_type) + body.encode('utf-8') + b'\x00\x00'
+    return struct.pack('<i', len(payload)) + payload
+
+
+async def read_packet(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    """(request id, type, body) of the next packet."""
+    size, = struct.unpack('<i', await reader.readexactly(4))
+    if not 10 <= size <= MAX_PACKET:
+        raise RconConnectionError(f"bad RCON packet length {size}")
+    data = await reader.readexactly(size)
+    request_id, packet_type = struct.unpack_from('<ii', data)
+    return request_id, packet_type, data[8:-2]
+
+
+class _Pending:
+    __slots__ = ('future', 'parts', 'sent_at', 'terminator_id')
+
+    def __init__(self, future: asyncio.Future, sent_at: float, terminator_id: Optional[int] = None):
+        self.future = future
+        self.parts: List[bytes] = []
+        self.sent_at = sent_at
+        self.terminator_id = terminator_id
+
+
+class RconClient:
+    """Asyncio Source RCON client, for both srcds and Minecraft.
+
+    The connection is opened on the first command and reopened on the next one after it drops, backing off from
+    `min_backoff` to `max_backoff` seconds while the server keeps refusing; commands sent during a backoff fail at
+    once instead of waiting. Commands are pipelined on the one connection, matched to their responses by request id.
+    Each command is followed by an empty RESPONSE_VALUE packet, which both games answer only after the whole
+    response, so responses split over several packets are reassembled; set `multipacket=False` for servers that
+    don't answer it.
+    """
+
+    def __init__(self, host: str, port: int, password: str, timeout: float = 5.0, connect_timeout: float = 5.0,
+                 min_backoff: float = 1.0, max_backoff: float = 60.0, multipacket: bool = True, name: str = 'RCON'):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.multipacket = multipacket
+        self.name = name
+        self.latency = DeliveryStats()
+        self.sent = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.connects = 0
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, _Pending] = {}
+        self._terminators: Dict[int, int] = {}  # terminator id -> command id
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+        self._backoff = 0.0
+        self._retry_at = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    def _next_id(self) -> int:
+        request_id = next(self._ids)
+        if request_id >= 2 ** 31 - 1:
+            self._ids = itertools.count(1)
+            request_id = next(self._ids)
+        return request_id
+
+    async def connect(self):
+        if self.connected:
+            return
+        async with self._connect_lock:
+            if self.connected:
+                return
+            now = time.monotonic()
+            if now < self._retry_at:
+                raise RconConnectionError(f"{self.name} unreachable, retrying in {self._retry_at - now:.1f}s")
+            try:
+                await asyncio.wait_for(self._open(), self.connect_timeout)
+            except RconAuthError:
+                self._fail_connect()
+                raise
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, RconError) as e:
+                self._fail_connect()
+                raise RconConnectionError(f"couldn't connect to {self.name} at {self.host}:{self.port}: {e!r}") from e
+            self._backoff = 0.0
+            self._retry_at = 0.0
+            self.connects += 1
+            logging.info(f"{self.name} | connected to {self.host}:{self.port}")
+
+    def _fail_connect(self):
+        self._close_transport()
+        self._backoff = min(self.max_backoff, self._backoff * 2 or self.min_backoff)
+        self._retry_at = time.monotonic() + self._backoff
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self._reader, self._writer = reader, writer
+        auth_id = self._next_id()
+        writer.write(encode_packet(auth_id, SERVERDATA_AUTH, self.password))
+        await writer.drain()
+        while True:
+            # srcds sends an empty RESPONSE_VALUE before the AUTH_RESPONSE, Minecraft doesn't
+            request_id, packet_type, _ = await read_packet(reader)
+            if packet_type != SERVERDATA_AUTH_RESPONSE:
+                continue
+            if request_id == -1:
+                raise RconAuthError(f"{self.name} rejected the RCON password")
+            if request_id == auth_id:
+                break
+        self._read_task = asyncio.ensure_future(self._read_loop(reader))
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        error: Exception = RconConnectionError(f"{self.name} closed the connection")
+        try:
+            while True:
+                request_id, packet_type, body = await read_packet(reader)
+                command_id = self._terminators.pop(request_id, None)
+                if command_id is not None:
+                    self._resolve(command_id)
+                    continue
+                pending = self._pending.get(request_id)
+                if pending is None:
+                    continue  # a timed out command, or srcds's extra answer to a terminator
+                pending.parts.append(body)
+                if not self.multipacket:
+                    self._resolve(request_id)
+        except asyncio.CancelledError:
+            raise
+        except (OSError, asyncio.IncompleteReadError, RconError) as e:
+            error = RconConnectionError(f"lost connection to {self.name}: {e!r}")
+        finally:
+            if self._reader is reader:
+                self._close_transport()
+                self._fail_all(error)
+
+    def _resolve(self, request_id: int):
+        pending = self._pending.pop(request_id, None)
+        if pending is None:
+            return
+        self.latency.record(time.perf_counter() - pending.sent_at)
+        if not pending.future.done():
+            pending.future.set_result(b''.join(pending.parts).decode('utf-8', 'replace'))
+
+    def _forget(self, request_id: int) -> Optional[_Pending]:
+        pending = self._pending.pop(request_id, None)
+        if pending is not None and pending.terminator_id is not None:
+            self._terminators.pop(pending.terminator_id, None)
+        return pending
+
+    def _fail_all(self, error: Exception):
+        pending, self._pending = self._pending, {}
+        self._terminators.clear()
+        for entry in pending.values():
+            if not entry.future.done():
+                entry.future.set_exception(error)
+
+    def _send(self, command: str) -> Tuple[int, asyncio.Future]:
+        request_id = self._next_id()
+        future = asyncio.get_running_loop().create_future()
+        packets = encode_packet(request_id, SERVERDATA_EXECCOMMAND, command)
+        terminator_id = None
+        if self.multipacket:
+            terminator_id = self._next_id()
+            self._terminators[terminator_id] = request_id
+            packets += encode_packet(terminator_id, SERVERDATA_RESPONSE_VALUE, '')
+        self._pending[request_id] = _Pending(future, time.perf_counter(), terminator_id)
+        self._writer.write(packets)
+        self.sent += 1
+        return request_id, future
+
+    async def _wait(self, request_id: int, future: asyncio.Future, timeout: float) -> str:
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._forget(request_id)
+            raise RconTimeoutError(f"{self.name} didn't answer within {timeout}s")
+        except RconError:
+            self.failed += 1
+            raise
+
+    async def command(self, command: str, timeout: Optional[float] = None) -> str:
+        """Runs one command and returns its whole response."""
+        return (await self.commands([command], timeout))[0]
+
+    async def commands(self, commands: Sequence[str], timeout: Optional[float] = None) -> List[str]:
+        """Runs the commands in order, all written before any response is awaited, and returns their responses.
+        Raises the first failure; the commands before it have run."""
+        if any(len(command.encode('utf-8')) > MAX_COMMAND for command in commands):
+            raise RconError(f"RCON command is longer than {MAX_COMMAND} bytes")
+        await self.connect()
+        sent = [self._send(command) for command in commands]
+        try:
+            await self._writer.drain()
+        except OSError as e:
+            for request_id, future in sent:
+                self._forget(request_id)
+                future.cancel()  # nothing awaits them now
+            self.failed += len(sent)
+            raise RconConnectionError(f"lost connection to {self.name}: {e!r}") from e
+        timeout = self.timeout if timeout is None else timeout
+        results = await asyncio.gather(*(self._wait(request_id, future, timeout) for request_id, future in sent),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    def _close_transport(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        if self._read_task is not None and self._read_task is not asyncio.current_task():
+            self._read_task.cancel()
+        self._read_task = None
+
+    def close(self):
+        self._close_transport()
+        self._fail_all(RconConnectionError(f"{self.name} connection closed"))
+
+    def __repr__(self):
+        return (f"<RconClient {self.name} {self.host}:{self.port} connected={self.connected} sent={self.sent} "
+                f"failed={self.failed} timeouts={self.timeouts} connects={self.connects} {self.latency}>")
+
+
+def _concat(payloads: List[Sequence[str]]) -> List[str]:
+    return [command for payload in payloads for command in payload]
+
+
+class OutboundMessage:
+    __slots__ = ('payload', 'origin', 'queued_at')
+
+    def __init__(self, payload: Any, origin: Optional[Hashable], queued_at: float):
+        self.payload = payload
+        self.origin = origin  # e.g. the Discord channel the message came from
+        self.queued_at = queued_at
+
+
+class RconOutbox:
+    """Ordered outbound queue of messages for one game server, drained by its own task so the caller never waits
+    on the game. Up to `max_batch` queued messages go out together: whatever arrived within `delay` seconds of the
+    first, or while the previous flush was in flight. `render` turns a batch's payloads into the commands to run,
+    pipelined on the one connection; by default each payload is already a list of commands. A flush that fails is
+    dropped and reported through `on_failure` once per origin, with how many of that origin's messages were lost.
+    Past `max_queued` messages the oldest are dropped and counted.
+    """
+
+    def __init__(self, rcon: RconClient, on_failure: Optional[Callable[[Hashable, Exception, int], None]] = None,
+                 render: Callable[[List[Any]], List[str]] = _concat, delay: float = 0.0, max_batch: int = 64,
+                 max_queued: int = 256):
+        self.rcon = rcon
+        self.on_failure = on_failure
+        self.render = render
+        self.delay = delay
+        self.max_batch = max_batch
+        self.max_queued = max_queued
+        self._queue: Deque[OutboundMessage] = collections.deque()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.commands = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def put(self, payload: Any, origin: Optional[Hashable] = None):
+        if not payload:
+            return
+        if len(self._queue) >= self.max_queued:
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(OutboundMessage(payload, origin, time.monotonic()))
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def _take(self) -> List[OutboundMessage]:
+        return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    async def _run(self):
+        while self._queue:
+            linger = self._queue[0].queued_at + self.delay - time.monotonic()
+            if linger > 0 and len(self._queue) < self.max_batch:
+                await asyncio.sleep(linger)
+            batch = self._take()
+            try:
+                commands = self.render([item.payload for item in batch])
+                await self.rcon.commands(commands)
+                self.commands += len(commands)
+                self.delivered += len(batch)
+            except Exception as e:  # anything escaping would end the task and strand every later put()
+                self.failed += len(batch)
+                logging.error(f"{self.rcon.name} | dropping {len(batch)} message(s): {type(e).__name__}: {e}")
+                if self.on_failure is not None:
+                    for origin, count in collections.Counter(item.origin for item in batch).items():
+                        try:
+                            self.on_failure(origin, e, count)
+                        except Exception as report_error:
+                            logging.error(f"{self.rcon.name} | couldn't report a failed delivery: {report_error}")
+            self.flushes += 1
+
+    async def join(self):
+        """Wait until everything queued so far has been sent or given up on."""
+        while self._task is not None and not self._task.done():
+            await asyncio.shield(self._task)
+
+    def close(self):
+        self._queue.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+    def __repr__(self):
+        return (f"<RconOutbox {self.rcon.name} queued={len(self._queue)} flushes={self.flushes} "
+                f"commands={self.commands} delivered={self.delivered} failed={self.failed} dropped={self.dropped}>")
@@ -0,0 +1,376 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import hikari
+
+DISCORD_LIMIT = 2000
+WEBHOOK_NAME = 'OGBotPlus game chat'
+
+
+def split_line(line: str, limit: int = DISCORD_LIMIT) -> List[str]:
+    return [line[i:i + limit] for i in range(0, len(line), limit)] or ['']
+
+
+def mention_key(user) -> int:
+    return int(getattr(user, 'id', user))
+
+
+def valid_webhook_username(name: str) -> bool:
+    lowered = name.lower()
+    return 0 < len(name) <= 80 and 'discord' not in lowered and 'clyde' not in lowered
+
+
+class RelayLine(str):
+    """A relayed line that knows who said it, so webhook mode can post it as them.
+
+    As a str it is the line the bot itself would post, e.g. "<Steve> hi"; `said` is just "hi".
+    """
+
+    def __new__(cls, text: str, speaker: Optional[str] = None, said: Optional[str] = None,
+                avatar_url: Optional[str] = None):
+        line = super().__new__(cls, text)
+        line.speaker = speaker
+        line.said = said if said is not None else text
+        line.avatar_url = avatar_url
+        return line
+
+
+class ChatLine:
+    __slots__ = ('text', 'mentions', 'queued_at', 'speaker', 'said', 'avatar_url')
+
+    def __init__(self, text: str, mentions: Tuple, queued_at: float, speaker: Optional[str] = None,
+                 said: Optional[str] = None, avatar_url: Optional[str] = None):
+        self.text = text
+        self.mentions = mentions  # of the whole batch the line came in with
+        self.queued_at = queued_at
+        self.speaker = speaker
+        self.said = said if said is not None else text
+        self.avatar_url = avatar_url
+
+
+class WebhookCache:
+    """One webhook per chat channel, reused across restarts by name. A channel where the bot lacks Manage Webhooks
+    is remembered as having none, and its game chat goes out as the bot."""
+
+    def __init__(self, rest: hikari.api.RESTClient, name: str = WEBHOOK_NAME):
+        self.rest = rest
+        self.name = name
+        self._hooks: Dict[int, Optional[hikari.IncomingWebhook]] = {}
+
+    async def get(self, channel: hikari.TextableGuildChannel) -> Optional[hikari.IncomingWebhook]:
+        if channel.id in self._hooks:
+            return self._hooks[channel.id]
+        try:
+            hook = next((w for w in await self.rest.fetch_channel_webhooks(channel.id)
+                         if isinstance(w, hikari.IncomingWebhook) and w.name == self.name and w.token), None)
+            if hook is None:
+                hook = await self.rest.create_webhook(channel.id, self.name, reason="Relaying game chat")
+        except hikari.ForbiddenError:
+            logging.warning(f"Can't manage webhooks in channel {channel.id}; relaying game chat there as the bot")
+            hook = None
+        except hikari.HTTPError as e:
+            logging.error(f"Couldn't set up the game chat webhook for channel {channel.id}: {e}")
+            return None  # try again next message
+        self._hooks[channel.id] = hook
+        return hook
+
+    def forget(self, channel_id: int):
+        self._hooks.pop(channel_id, None)
+
+
+class ChannelCall:
+    """Any other request against the channel, e.g. a plain message or a topic edit. Calls sharing a `key`
+    replace each other while still queued, so only the latest topic is ever sent."""
+    __slots__ = ('call', 'key', 'queued_at')
+
+    def __init__(self, call: Callable[[hikari.TextableGuildChannel], Awaitable], key: Optional[str], queued_at: float):
+        self.call = call
+        self.key = key
+        self.queued_at = queued_at
+
+
+class DeliveryStats:
+    def __init__(self, keep: int = 512):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = collections.deque(maxlen=keep)
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __repr__(self):
+        return (f"DeliveryStats(n={self.count}, mean={self.mean * 1000:.0f}ms, p50={self.percentile(50) * 1000:.0f}ms, "
+                f"p99={self.percentile(99) * 1000:.0f}ms, max={self.max * 1000:.0f}ms)")
+
+
+class ChannelRelay:
+    """Ordered outbound queue for one Discord channel, drained by its own task.
+
+    Game chat lines are queued without blocking the log reader and sent packed into as few <= 2000 char messages as
+    possible: a message goes out once the queue holds a full one, something else is queued behind it, or `delay`
+    seconds after the first line arrived. While a send is in flight (including hikari sleeping off a 429) new lines
+    keep merging into the next message. If the queue grows past `max_lines` the oldest lines are dropped and counted.
+    """
+
+    def __init__(self, channel: hikari.TextableGuildChannel, delay: float = 0.25, limit: int = DISCORD_LIMIT,
+                 max_lines: int = 2000, webhooks: Optional[WebhookCache] = None, backlog: int = 20):
+        self.channel = channel
+        # when set, chat is posted through the channel's webhook as whoever said it; once more than `backlog` lines
+        # are waiting, speakers are merged into messages in the bot's format instead of falling further behind
+        self.webhooks = webhooks
+        self.backlog = backlog
+        self.delay = delay
+        self.limit = limit
+        self.max_lines = max_lines
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.latency = DeliveryStats()  # queued -> request completed, per line or call
+        self._queue: Deque[Union[ChatLine, ChannelCall]] = collections.deque()
+        self._lines = 0
+        self._size = 0  # length of the queued chat lines once joined
+        self._ready = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, lines: Iterable[str], user_mentions: Sequence[hikari.Snowflakeish] = ()):
+        mentions = tuple(user_mentions)
+        now = time.monotonic()
+        for line in lines:
+            if len(line) <= self.limit:
+                items = [ChatLine(str(line), mentions, now, getattr(line, 'speaker', None),
+                                  getattr(line, 'said', None), getattr(line, 'avatar_url', None))]
+            else:  # too long for one message; posted by the bot in pieces
+                items = [ChatLine(chunk, mentions, now) for chunk in split_line(line, self.limit)]
+            for item in items:
+                if self._lines >= self.max_lines:
+                    self._drop_oldest_line()
+                self._queue.append(item)
+                self._lines += 1
+                self._size += len(item.text) + 1
+        self._wake()
+
+    def call(self, call: Callable[[hikari.TextableGuildChannel], Awaitable], key: Optional[str] = None):
+        if key is not None:
+            for item in self._queue:
+                if isinstance(item, ChannelCall) and item.key == key:
+                    item.call = call
+                    return
+        self._queue.append(ChannelCall(call, key, time.monotonic()))
+        self._wake()
+
+    def _drop_oldest_line(self):
+        for item in self._queue:
+            if isinstance(item, ChatLine):
+                self._queue.remove(item)
+                self._lines -= 1
+                self._size -= len(item.text) + 1
+                self.dropped += 1
+                return
+
+    def _wake(self):
+        if self._size > self.limit or (self._queue and isinstance(self._queue[-1], ChannelCall)):
+            self._ready.set()
+        if self._queue and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _speaks_as(self, line: ChatLine) -> Optional[Tuple[str, Optional[str]]]:
+        if self.webhooks is None or line.speaker is None or not valid_webhook_username(line.speaker):
+            return None
+        if not line.said.strip():  # nothing to post as them; the bot posts the whole line instead
+            return None
+        return line.speaker, line.avatar_url
+
+    def _pack(self) -> Tuple[str, List[hikari.Snowflakeish], List[ChatLine], Optional[Tuple[str, Optional[str]]]]:
+        parts = []
+        size = -1
+        mentions = {}
+        backlogged = self._lines > self.backlog
+        identity = None if backlogged else self._speaks_as(self._queue[0])
+        while self._queue and isinstance(self._queue[0], ChatLine):
+            line = self._queue[0]
+            # a webhook message has one author, so each run of lines by the same speaker is its own message
+            text = line.said if identity else line.text
+            if parts and (size + len(text) + 1 > self.limit or
+                          (not backlogged and self._speaks_as(line) != identity)):
+                break
+            self._queue.popleft()
+            self._lines -= 1
+            self._size -= len(line.text) + 1
+            parts.append(line)
+            size += len(text) + 1
+            for user in line.mentions:
+                mentions.setdefault(mention_key(user), user)
+        text = '\n'.join(line.said if identity else line.text for line in parts)
+        return text, list(mentions.values()), parts, identity
+
+    async def _send_chat(self, text: str, mentions: List[hikari.Snowflakeish],
+                         identity: Optional[Tuple[str, Optional[str]]]):
+        username, avatar_url = identity or (hikari.UNDEFINED, None)
+        for attempt in range(2):
+            hook = await self.webhooks.get(self.channel) if self.webhooks is not None else None
+            if hook is None:
+                await self.channel.send(text, user_mentions=mentions)
+                return
+            try:
+                await hook.execute(text, username=username, avatar_url=avatar_url or hikari.UNDEFINED,
+                                   user_mentions=mentions)
+                return
+            except hikari.NotFoundError:
+                if attempt:
+                    raise
+                # someone deleted the webhook; make a new one and try once more
+                self.webhooks.forget(self.channel.id)
+
+    async def _run(self):
+        while self._queue:
+            if isinstance(self._queue[0], ChannelCall):
+                item = self._queue.popleft()
+                delivered = await self._deliver(item.call)
+                if delivered:
+                    self.latency.record(time.monotonic() - item.queued_at)
+                elif delivered is None:
+                    self._queue.appendleft(item)
+                continue
+            linger = self._queue[0].queued_at + self.delay - time.monotonic()
+            if linger > 0 and not self._ready.is_set():
+                try:
+                    await asyncio.wait_for(self._ready.wait(), linger)
+                except asyncio.TimeoutError:
+                    pass
+            self._ready.clear()
+            if not self._queue or not isinstance(self._queue[0], ChatLine):
+                continue  # the lines waited on were dropped for newer ones, leaving a call in front to send first
+            text, mentions, lines, identity = self._pack()
+            delivered = await self._deliver(lambda _: self._send_chat(text, mentions, identity))
+            if delivered:
+                done = time.monotonic()
+                for line in lines:
+                    self.latency.record(done - line.queued_at)
+            elif delivered is None:
+                # back in front, so whatever arrived meanwhile packs in behind it
+                self._queue.extendleft(reversed(lines))
+                self._lines += len(lines)
+                self._size += sum(len(line.text) + 1 for line in lines)
+            if self._size > self.limit or any(isinstance(item, ChannelCall) for item in self._queue):
+                self._ready.set()
+
+    async def _deliver(self, call: Callable[[hikari.TextableGuildChannel], Awaitable]) -> Optional[bool]:
+        """True once sent, None if it should be retried, False if it was dropped."""
+        try:
+            await call(self.channel)
+            self.sent += 1
+            return True
+        except hikari.RateLimitTooLongError as e:
+            # longer than hikari is willing to sleep for; wait it out here and try again
+            self.rate_limited += 1
+            await asyncio.sleep(e.retry_after)
+            return None
+        except (hikari.ForbiddenError, hikari.NotFoundError) as e:
+            self.failed += 1
+            logging.error(f"Can't relay to channel {self.channel.id}, dropping a request: {e}")
+        except Exception as e:
+            self.failed += 1
+            logging.error(f"Relaying to channel {self.channel.id} failed, dropping a request: {type(e)}: {e}")
+        return False
+
+    async def join(self):
+        """Wait until everything queued so far has been sent."""
+        while self._task is not None and not self._task.done():
+            await asyncio.shield(self._task)
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def __repr__(self):
+        return (f"<ChannelRelay {self.channel.id} queued={len(self._queue)} sent={self.sent} dropped={self.dropped} "
+                f"failed={self.failed} rate_limited={self.rate_limited} {self.latency}>")
+
+
+class RelayHub:
+    """Fans every multi-channel request out to a ChannelRelay per chat channel, so the channels are written to
+    concurrently and a slow guild only delays itself."""
+
+    def __init__(self, bot, delay: float = 0.25, mode: str = 'bot'):
+        self.bot = bot
+        self.delay = delay
+        # 'webhook' posts game chat through a webhook per channel, as the player, in the webhook's own rate limit
+        self.webhooks = WebhookCache(bot.rest) if mode == 'webhook' else None
+        self.channels: Dict[int, ChannelRelay] = {}
+        self._version = None
+
+    def _prune(self):
+        """Drops the relays of channels that are no longer resolved, e.g. because they were deleted."""
+        current = {int(chan.id) for chan in self.bot.chat_channels_obj}
+        for channel_id in [channel_id for channel_id in self.channels if channel_id not in current]:
+            self.channels.pop(channel_id).close()
+            if self.webhooks is not None:
+                self.webhooks.forget(channel_id)
+
+    def _relays(self, exclude: Optional[hikari.Snowflakeish] = None) -> List[ChannelRelay]:
+        version = getattr(self.bot, 'channels_version', None)
+        if version != self._version:
+            self._version = version
+            self._prune()
+        relays = []
+        for chan in self.bot.chat_channels_obj:
+            if exclude is not None and chan.id == int(exclude):
+                continue
+            relay = self.channels.get(chan.id)
+            if relay is None:
+                relay = self.channels[chan.id] = ChannelRelay(chan, self.delay, webhooks=self.webhooks)
+            relay.channel = chan
+            relays.append(relay)
+        return relays
+
+    def publish(self, lines: List[str], user_mentions: Sequence[hikari.Snowflakeish] = ()):
+        """Game chat, packed with whatever else is waiting for each channel."""
+        if not lines:
+            return
+        for relay in self._relays():
+            relay.put(lines, user_mentions)
+
+    def send(self, content: str = hikari.UNDEFINED, exclude: Optional[hikari.Snowflakeish] = None, **kwargs):
+        for relay in self._relays(exclude):
+            relay.call(lambda chan: chan.send(content, **kwargs))
+
+    def send_to(self, channel_id: hikari.Snowflakeish, content: str = hikari.UNDEFINED, **kwargs):
+        """A message for one chat channel only, e.g. an error about something said there."""
+        for relay in self._relays():
+            if relay.channel.id == int(channel_id):
+                relay.call(lambda chan: chan.send(content, **kwargs))
+
+    def edit(self, key: Optional[str] = None, **kwargs):
+        for relay in self._relays():
+            relay.call(lambda chan: chan.edit(**kwargs), key=key)
+
+    async def join(self):
+        await asyncio.gather(*(relay.join() for relay in self.channels.values()))
+
+    def close(self):
+        for relay in self.channels.values():
+            relay.close()
+
+    def __repr__(self):
+        return f"RelayHub({', '.join(repr(relay) for relay in self.channels.values())})"
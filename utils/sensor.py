@@ -1,97 +1,206 @@
-import csv
+import asyncio
 import logging
 import os
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from os import path
 from pathlib import Path
-from typing import Dict, Tuple, List, Union
+from typing import Dict, Tuple, List, Union, Optional, NamedTuple
 
 import psutil
-import toml
 from docker import DockerClient
 from docker.models.containers import Container
 
-docker_client = DockerClient(base_url='unix://var/run/docker.sock', tls=True, version="auto")
+from utils import procnet
+from utils.docker_events import ContainerRegistry
+from utils.gameinfo import MetadataCache
+
+_docker_client: Optional[DockerClient] = None
+container_registry: Optional[ContainerRegistry] = None
+metadata_cache = MetadataCache()
+_port_index: Optional[procnet.PortIndex] = None
+_port_index_spec: Optional[tuple] = None
+# every sensor call is blocking (psutil, /proc, docker-py); they all run here, one at a time, off the event loop
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sensor')
+
+
+class SensorSnapshot(NamedTuple):
+    any_running: bool
+    servers: Tuple[Tuple[int, Union[psutil.Process, Container]], ...]
+    taken_at: float
+    scan_duration: float  # seconds spent scanning
+    queue_time: float  # seconds spent waiting for the sensor thread
+
+
+class SensorMetrics:
+    def __init__(self):
+        self.scans = 0
+        self.last_scan_duration = 0.0
+        self.last_queue_time = 0.0
+        self.max_scan_duration = 0.0
+        self.max_queue_time = 0.0
+        self.total_scan_duration = 0.0
+
+    def record(self, snap: SensorSnapshot):
+        self.scans += 1
+        self.last_scan_duration = snap.scan_duration
+        self.last_queue_time = snap.queue_time
+        self.max_scan_duration = max(self.max_scan_duration, snap.scan_duration)
+        self.max_queue_time = max(self.max_queue_time, snap.queue_time)
+        self.total_scan_duration += snap.scan_duration
+
+    @property
+    def mean_scan_duration(self) -> float:
+        return self.total_scan_duration / self.scans if self.scans else 0.0
+
+    def __repr__(self):
+        return (f"SensorMetrics(scans={self.scans}, last={self.last_scan_duration * 1000:.1f}ms, "
+                f"mean={self.mean_scan_duration * 1000:.1f}ms, max={self.max_scan_duration * 1000:.1f}ms, "
+                f"queue={self.last_queue_time * 1000:.1f}ms)")
+
+
+metrics = SensorMetrics()
+
+
+async def snapshot(ports: List[int]) -> SensorSnapshot:
+    snap = await asyncio.get_running_loop().run_in_executor(_executor, _scan, list(ports), time.monotonic())
+    metrics.record(snap)
+    return snap
+
+
+async def game_info(process: Union[psutil.Process, Container]) -> Dict:
+    return await asyncio.get_running_loop().run_in_executor(_executor, get_game_info, process)
+
+
+def _scan(ports: List[int], submitted: float) -> SensorSnapshot:
+    started = time.monotonic()
+    # one /proc/net parse and one container listing per tick, shared by both answers
+    procs = get_running_procs(ports)
+    containers = list_running_containers()
+    any_running = bool(procs or containers)
+    servers = tuple(get_running_servers(ports, procs, containers)) if any_running else ()
+    return SensorSnapshot(any_running, servers, time.time(), time.monotonic() - started, started - submitted)
+
+
+def docker_client() -> DockerClient:
+    # connected on first use rather than on import, so the server classes load without a daemon
+    global _docker_client
+    if _docker_client is None:
+        _docker_client = DockerClient(base_url='unix://var/run/docker.sock', tls=True, version="auto")
+    return _docker_client
+
+
+def start_container_registry(loop) -> ContainerRegistry:
+    global container_registry
+    if container_registry is None:
+        container_registry = ContainerRegistry(docker_client(), loop)
+    container_registry.start()
+    return container_registry
+
+
+def stop_container_registry():
+    if container_registry is not None:
+        container_registry.stop()
+
+
+def list_running_containers() -> List[Container]:
+    # fall back to asking the daemon directly until the event stream has synced
+    if container_registry is not None and container_registry.synced:
+        return container_registry.containers()
+    return docker_client().containers.list(filters={'status': 'running'})
+
+
+def port_index(ports: List[int]) -> procnet.PortIndex:
+    # rebuilt only when the configured port range changes, so owner lookups carry over between ticks
+    global _port_index, _port_index_spec
+    spec = tuple(tuple(x) if isinstance(x, list) else x for x in ports)
+    if _port_index is None or spec != _port_index_spec:
+        _port_index = procnet.PortIndex(ports)
+        _port_index_spec = spec
+    return _port_index
 
 
 def are_servers_running(ports: List[int]) -> bool:
+    if procnet.available():
+        return port_index(ports).any_listening() or len(list_running_containers()) > 0
+    game_ports = port_index(ports).ports
     for p in psutil.process_iter(attrs=['connections']):
         if not p.info['connections']:
             continue
         for x in p.info['connections']:
-            if x.laddr.port in ports:
+            if x.laddr.port in game_ports:
                 return True
     else:
         # print('hmm')
-        if len(docker_client.containers.list(filters={'status': 'running'})) > 0:
+        if len(list_running_containers()) > 0:
             return True
     return False
 
 
-def get_running_servers(ports: List[int]) -> List[Tuple[int, Union[psutil.Process, Container]]]:
+def get_running_servers(ports: List[int], procs: Optional[List[Tuple[int, psutil.Process]]] = None,
+                        containers: Optional[List[Container]] = None
+                        ) -> List[Tuple[int, Union[psutil.Process, Container]]]:
     # print("get_running_servers")
     running_servers = []
-    used_ports = []
-    result = docker_client.containers.list(filters={'status': 'running'}, all=True)
+    result = list_running_containers() if containers is None else containers
     logging.debug(ports)
 
     # bare-metal processes
-    for p in psutil.process_iter():
-        try:
-            if not p.connections(kind='inet4'):
-                continue
-            connections = [y.laddr.port for y in p.connections(kind='inet4')]
-        except psutil.AccessDenied:
-            continue
-        connections.sort()
-        for x in connections:
-            logging.debug(x)
-            if x in ports and p not in used_ports:
-                running_servers.append((x, p))
-                used_ports.append(p)
+    running_servers.extend(get_running_procs(ports) if procs is None else procs)
     logging.debug(running_servers)
 
     # docker containers
+    game_ports = port_index(ports).ports
     for container in result:
+        seen = set()
         for con_port, host_info in container.ports.items():
-            logging.debug("host_info")
-            logging.debug(host_info)
-
-            # asdf = [conn['HostPort'] for conn in host_info if host_info]
-            # logging.debug(asdf in ports)
-            # logging.debug(int(asdf[0]) in ports)
-
-            logging.debug([conn['HostPort'] for conn in host_info if int(conn['HostPort'])])
-            if host_info:
-                running_servers.extend([(conn['HostPort'], container) for conn in host_info if
-                                        int(conn['HostPort']) in ports
-                                        and ':' not in conn['HostIp']
-                                        and 'tcp' in con_port])
-                logging.debug(f"Key: {con_port}; Value: {host_info}")
-            else:
-                logging.debug(con_port)
+            logging.debug(f"Key: {con_port}; Value: {host_info}")
+            if not host_info:
+                continue
+            # udp mappings count too, or udp-only games (valheim) are never found
+            for conn in host_info:
+                if conn['HostPort'] in game_ports and ':' not in conn['HostIp'] and conn['HostPort'] not in seen:
+                    running_servers.append((conn['HostPort'], container))
+                    seen.add(conn['HostPort'])
     logging.debug("running_servers")
     logging.debug(running_servers)
     return running_servers
 
 
 def get_running_procs(ports: List[int]) -> List[Tuple[int, Union[psutil.Process, str]]]:
-    running_procs = []
-    temp = []
-    for p in psutil.process_iter(attrs=['connections']):
-        if not p.info['connections']:
+    if procnet.available():
+        running_procs = []
+        for port, pid in port_index(ports).scan():
+            try:
+                running_procs.append((port, psutil.Process(pid)))
+            except psutil.NoSuchProcess:
+                continue
+        return running_procs
+    return _get_running_procs_psutil(ports)
+
+
+def _get_running_procs_psutil(ports: List[int]) -> List[Tuple[int, psutil.Process]]:
+    running_servers = []
+    used_ports = []
+    game_ports = port_index(ports).ports
+    for p in psutil.process_iter():
+        try:
+            if not p.connections(kind='inet4'):
+                continue
+            connections = [y.laddr.port for y in p.connections(kind='inet4')]
+        except psutil.AccessDenied:
             continue
-        connections = [y.laddr.port for y in p.info['connections']]
         connections.sort()
         for x in connections:
-            if x in ports and p not in temp:
-                running_procs.append((x, p))
-                temp.append(p)
-    return running_procs
+            logging.debug(x)
+            if x in game_ports and p not in used_ports:
+                running_servers.append((x, p))
+                used_ports.append(p)
+    return running_servers
 
 
 def get_running_containers(ports: List[int]):
-    result = docker_client.containers.list(filters={'status': 'running'}, all=True)
+    result = list_running_containers()
     running_cons = []
     for container in result:
         for _, v in container.ports.items():
@@ -116,7 +225,8 @@ def find_root_directory(start_dir: str) -> str:
             parent, current = path.split(parent)
             if "serverfiles" in parent:  # if using LGSM, move up until you're in the top folder, if using MC, ignore
                 continue
-            elif "serverfiles" not in parent and "serverfiles" in current:  # if already in top folder or running MC return parent
+            # if already in top folder or running MC return parent
+            elif "serverfiles" not in parent and "serverfiles" in current:
                 looking_for_root = False
                 return parent
             elif "serverfiles" not in parent:
@@ -131,7 +241,6 @@ def get_game_info(process: Union[psutil.Process, Container]) -> Dict:
         try:
             cwd = process.cwd()
             root = find_root_directory(cwd)
-            toml_path = path.join(root, '.gameinfo.toml')
 
             defaults = {'name': Path(root).name,
                         'game': '',
@@ -142,49 +251,23 @@ def get_game_info(process: Union[psutil.Process, Container]) -> Dict:
         except ProcessLookupError:
             raise ProcessLookupError('Process not running or not accessible by bot.')
         if is_lgsm(process):
-            game_name = ""
-            with os.scandir(root) as scan:
-                for f in scan:
-                    if f.name.endswith('server'):
-                        game_name = f.name
-                        break
             # define paths to noteworthy places
             root_dir = root
-            log_dir = path.join(root_dir, 'log')
-            server_files = path.join(root_dir, 'serverfiles')
-            lgsm_dir = path.join(root_dir, 'lgsm')
-            config_dir = path.join(lgsm_dir, 'config-lgsm', game_name)
-            readable_name = ''
-            try:
-                with open(path.join(config_dir, f'{game_name}.cfg')) as f:
-                    game_cfg = toml.load(f)
-            except toml.TomlDecodeError as e:
-                print("File failed to parse.")
-                print(e)
-                print(e.mro())
-            with open(path.join(lgsm_dir, 'data', 'serverlist.csv')) as svr_names:
-                for row in csv.reader(svr_names, csv.unix_dialect):
-                    if row[1] == game_name:
-                        readable_name = row[2]
-                        break
-
-            defaults = {'name': readable_name,
-                        'game': game_name,
+            lgsm = metadata_cache.lgsm_info(root_dir)
+
+            defaults = {'name': lgsm['name'],
+                        'game': lgsm['game'],
                         'folder': root_dir,
-                        'logs': log_dir,
-                        'configs': config_dir,
-                        'server_files': server_files,
-                        # This list comprehension is really annoying and probably pointless.
-                        'rcon_password': [v if re.match("rcon.?pa", k, re.I) else '' for k, v in game_cfg.items()][0],
-                        'launch_script': path.join(root_dir, game_name),
+                        'logs': path.join(root_dir, 'log'),
+                        'configs': lgsm['configs'],
+                        'server_files': path.join(root_dir, 'serverfiles'),
+                        'rcon_password': lgsm['rcon_password'],
+                        'launch_script': path.join(root_dir, lgsm['game']),
                         'executable': process.name(),
                         'command': process.cmdline()}
     elif isinstance(process, Container):
         # print(process)
         root = Path(process.labels['com.docker.compose.project.working_dir'])
-        # print(root)
-        toml_path = path.join(root, '.gameinfo.toml')
-        # print(toml_path)
         try:
             defaults = {'name': Path(root).name,
                         'game': process.labels['com.docker.compose.service'],
@@ -200,37 +283,5 @@ def get_game_info(process: Union[psutil.Process, Container]) -> Dict:
     else:
         raise RuntimeError('get_game_info was passed an object that was not a Process or a Container')
 
-    # if the TOML file exists, load then override the defaults, and save
-    # this should correctly add new fields when they are programmed in.
-    if os.path.isfile(toml_path):
-        # print('is file')
-        try:
-            with open(toml_path) as file:
-
-                game_info = {**defaults, **toml.load(file)}
-
-            with open(toml_path, "w") as file:
-                toml.dump(game_info, file)
-
-        except toml.TomlDecodeError as e:
-            print(f"TOML decoding error | {e}")
-            raise toml.TomlDecodeError
-        except Exception as e:
-            print(f"Exception {type(e)}: {e}")
-        return game_info
-    else:
-        # print('generating file')
-        try:
-            # if the TOML file doesn't exist, create it, load defaults, and save
-            Path(toml_path).touch()
-            print(f"created new gameinfo file at {toml_path}")
-
-            with open(toml_path, "w") as file:
-                toml.dump(defaults, file)
-        except toml.TomlDecodeError as e:
-            print(f"TOML decoding error | {e}")
-            raise toml.TomlDecodeError
-        except Exception as e:
-            print(f"Exception {type(e)}: {e}")
-
-        return defaults
+    # stored values override the defaults; the file is only rewritten when new fields are programmed in.
+    return metadata_cache.game_info(str(root), defaults)
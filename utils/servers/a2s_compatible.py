@@ -1,9 +1,5 @@
-import asyncio
-
-import a2s
-from hikari.errors import ForbiddenError
-
 from utils.servers.base import BaseServer
+from utils.status import ServerStatus, a2s_status
 
 
 class A2SCompatibleServer(BaseServer):
@@ -15,20 +11,18 @@ class A2SCompatibleServer(BaseServer):
         self.loop.create_task(self.wait_for_death())
 
     async def update_server_information(self):
-        while self.proc.is_running() and self.bot.is_alive:
-            try:
-                info = await a2s.ainfo((self.ip, self.query_port))
+        self.poll_status()
+
+    async def query_status(self) -> ServerStatus:
+        return await a2s_status(self.ip, self.query_port, self.bot.status_scheduler.timeout)
 
-                cur_p = info.player_count
-                chat_status = f"{self.readable_name} | ({cur_p} player{'s' if cur_p != 1 else ''})"
-                await self.bot.add_game_chat_info(self.name, chat_status)
-                status = f"""
+    async def status_changed(self, status: ServerStatus):
+        if not status.online:
+            print(f"{self._repr} | Status query failed: {status.error}")
+            return
+        cur_p = status.players
+        chat_status = f"{self.readable_name} | ({cur_p} player{'s' if cur_p != 1 else ''})"
+        await self.bot.add_game_chat_info(self.name, chat_status)
+        await self.bot.add_game_presence(self.name, f"""
 {self.readable_name} ({cur_p} player{'s' if cur_p != 1 else ''} online)
-"""
-                await self.bot.add_game_presence(self.name, status)
-            except ForbiddenError:
-                print("Bot lacks permission to edit channels. (hikari.ForbiddenError)")
-            except Exception as e:
-                print(f"Error: {e} {type(e)}")
-            finally:
-                await asyncio.sleep(30)
+""")
@@ -1,11 +1,11 @@
 import asyncio
-import datetime
 import logging
-from typing import List, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 
 import hikari
-import lightbulb
-import regex
+
+from utils.rcon import RconClient, RconOutbox
+from utils.status import ServerStatus
 
 
 class BaseServer:
@@ -22,9 +22,10 @@ class BaseServer:
         self.loop = asyncio.get_running_loop()
 
         self.rcon_port: int = int(kwargs.pop('rcon_port', 22232))
-        self.rcon = None
-        self.rcon_lock = asyncio.Lock()
-        self.last_reconnect: datetime.datetime = datetime.datetime(1, 1, 1)
+        # connects on the first command, so servers that never use it don't pay for it
+        self.rcon = RconClient(self.rcon_host(), self.rcon_port, self.password, name=f"{self.name} RCON")
+        self.outbox: Optional[RconOutbox] = None  # guild chat on its way to the game, for servers that relay it
+        self._alive = True
 
         if self.__class__.__name__ == 'BaseServer':
             self.loop.create_task(self.update_server_information())
@@ -33,8 +34,12 @@ class BaseServer:
     def __repr__(self):
         return self._repr
 
+    def rcon_host(self) -> str:
+        return self.ip
+
     def is_running(self) -> bool:
-        return self.proc.is_running()
+        # flipped by wait_for_death, so the relay loops don't need a syscall per iteration
+        return self._alive
 
     async def _log_loop(self):
         pass
@@ -48,59 +53,70 @@ class BaseServer:
     async def update_server_information(self):
         await self.bot.add_game_presence(self.name, self.name)
 
-    def check_for_mentions(self, message: str) -> Tuple[List[hikari.snowflakes.Snowflakeish], str]:
-        indexes: List[int] = [m.start() for m in regex.finditer('@', message)]
-        mentioned_members = []
-        for index in indexes:
-            try:
-                mention = message[index + 1:]
-                for chan in self.bot.chat_channels_obj:
-                    for ind in range(0, min(len(mention) + 1, 32)):
-                        member = lightbulb.utils.find(self.bot.cache.get_guild(chan.guild_id).get_members().values(),
-                                                      lambda m: m.username == mention[:ind] or
-                                                                m.nickname == mention[:ind])
-                        if member:
-                            mentioned_members.append(member)
-                            message = message.replace("@" + mention[:ind], f"<@{member.id}>")
-                            break
-
-            except Exception as e:
-                logging.critical("ERROR | Server2Guild Mentions Exception caught: " + str(e))
-                pass
-        return mentioned_members, message
-
-    @staticmethod
-    async def sleep_with_backoff(tries, wait_time=5):
-        await asyncio.sleep(wait_time * tries)
-
-    async def send_game_message(self, content: List[str]):
+    def poll_status(self):
+        """Hands the server to the bot's status scheduler, which calls query_status and then status_changed whenever
+        the result differs from the last."""
+        self.bot.status_scheduler.register(self, self.query_status, self.status_changed)
+
+    async def query_status(self) -> ServerStatus:
+        return ServerStatus(False, error="not supported")
+
+    async def status_changed(self, status: ServerStatus):
         pass
 
     @property
-    def players(self) -> int:
-        return 0
+    def status(self) -> Optional[ServerStatus]:
+        """The latest status the scheduler got, if the server is polled."""
+        return self.bot.status_scheduler.get(self)
+
+    def check_for_mentions(self, message: str) -> Tuple[List[hikari.snowflakes.Snowflakeish], str]:
+        if '@' not in message:
+            return [], message
+        try:
+            # earlier chat channels' guilds win when a name matches in several
+            guild_ids = list(dict.fromkeys(chan.guild_id for chan in self.bot.chat_channels_obj))
+            return self.bot.mentions.resolve(message, guild_ids)
+        except Exception as e:
+            logging.critical("ERROR | Server2Guild Mentions Exception caught: " + str(e))
+            return [], message
 
-    def is_chat_channel(self, m: hikari.events.GuildMessageCreateEvent) -> bool:
-        for chan in self.bot.chat_channels:
-            if chan == m.channel_id:
-                return True
-        else:
-            return False
+    @property
+    def players(self) -> int:
+        status = self.status
+        return status.players if status is not None else 0
+
+    def _delivery_failed(self, channel_id: hikari.Snowflakeish, error: Exception, count: int):
+        self.bot.relay.send_to(channel_id, f"Couldn't deliver {'your message' if count == 1 else f'{count} messages'} "
+                                           f"to {self.name}; it may be restarting.")
+
+    async def guild_messages(self) -> AsyncIterator[hikari.events.GuildMessageCreateEvent]:
+        """Chat from the guilds' chat channels, already filtered by the bot's dispatcher, until teardown."""
+        queue = self.bot.chat_dispatch.register(self)
+        try:
+            while self.is_running() and self.bot.is_alive:
+                msg = await queue.get()
+                if msg is None:  # unregistered
+                    break
+                yield msg
+        finally:
+            self.bot.chat_dispatch.unregister(self)
 
     async def wait_for_death(self):
-        x = True
-        proc = await asyncio.create_subprocess_shell(cmd=f"python3 utils/watch.py {self.proc.pid}")
-        print('waiting for the server to DIE')
-        while x:
-            if proc.returncode is None:
-                await asyncio.sleep(5)
-            else:
-                await asyncio.sleep(3)
-                x = False
-        self.teardown()
+        logging.debug('waiting for the server to DIE')
+        await self.bot.exit_watcher.watch(self.proc.pid)
+        if self._alive:  # discovery may have torn it down already, when its port went away first
+            self.teardown()
 
     def teardown(self):
-        self.bot.games.pop(str(self.port), None)
+        # stops this object's loops, so a server whose port comes back isn't relayed by it and its successor both
+        self._alive = False
+        self.bot.chat_dispatch.unregister(self)
+        self.bot.status_scheduler.unregister(self)
+        if self.outbox is not None:
+            self.outbox.close()
+        self.rcon.close()
+        if self.bot.games.get(str(self.port)) is self:
+            self.bot.games.pop(str(self.port))
         asyncio.ensure_future(self.bot.remove_game_presence(self.name))
         asyncio.ensure_future(self.bot.remove_game_chat_info(self.name))
         logging.critical('teardown successful!')
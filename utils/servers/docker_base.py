@@ -1,16 +1,20 @@
 import asyncio
 import logging
+import time
 from typing import List
 
-import docker.errors
-import requests.exceptions
-
+from utils import sensor
+from utils.docker_logwatch import DOCKER_SOCKET, DockerLogStream
 from utils.servers.base import BaseServer
 
 
 class BaseDockerServer(BaseServer):
+    docker_socket = DOCKER_SOCKET
+
     def __init__(self, bot, process, **kwargs):
         super(BaseDockerServer, self).__init__(bot, process, **kwargs)
+        self.containers = sensor.start_container_registry(self.loop)
+        self._log_since = time.time()
 
         if self.__class__.__name__ == 'BaseServer':
             self.loop.create_task(self.update_server_information())
@@ -28,58 +32,27 @@ class BaseDockerServer(BaseServer):
                 await asyncio.sleep(.1)
 
     async def read_server_log(self):
-        watcher = await asyncio.create_subprocess_shell(cmd=f"docker logs -f --tail 0 --since 0m {self.proc.id}",
-                                                        stdout=asyncio.subprocess.PIPE)
-        while self.is_running() and self.bot.is_alive:
-            await asyncio.wait([self._read_stream(self, watcher.stdout, self.process_server_messages)])
-        pass
-
-    @staticmethod
-    async def _read_stream(self, stream: asyncio.streams.StreamReader, cb):
-        while True:
-            await asyncio.sleep(3)
-            try:
-                raw = await asyncio.wait_for(stream.read(n=7000), .5)
-                raw_str = raw.decode('utf-8')
-                lines = raw_str.split('\r\n')
-                if lines:
-                    await cb(lines)
-            except asyncio.exceptions.TimeoutError:
-                continue
-            except Exception as e:
-                print(type(e))
-                print(e)
+        # resume from the last line seen, so nothing written while reconnecting is lost
+        stream = DockerLogStream(self.proc.id, socket_path=self.docker_socket, since=self._log_since,
+                                 tty=self.proc.attrs['Config'].get('Tty'))
+        try:
+            async for lines in stream.batches():
+                await self.process_server_messages(lines)
+                if not (self.is_running() and self.bot.is_alive):
+                    break
+        finally:
+            self._log_since = stream.last_received
+            await stream.close()
 
     async def process_server_messages(self, text: List[str]):
         pass
 
     def is_running(self) -> bool:
-        logging.debug("checking if server is running")
-        try:
-            self.proc.reload()
-            if self.proc.status == 'running':
-                return True
-            else:
-                return False
-        except requests.exceptions.HTTPError:
-            return False
-        except docker.errors.NotFound:
-            return False
+        return self._alive and self.containers.is_running(self.proc.id)
 
     async def wait_for_death(self):
         logging.debug('waiting for the server to DIE')
-        while True:
-            try:
-                self.proc.reload()
-                if self.proc.status == 'running':
-                    await asyncio.sleep(5)
-                else:
-                    await asyncio.sleep(2)
-                    break
-            except requests.exceptions.HTTPError:
-                break
-            except docker.errors.NotFound:
-                logging.info("Docker container no longer found. Possibly shut down.")
-                pass
-        self.teardown()
+        await self.containers.stopped(self.proc.id)
+        if self._alive:  # discovery may have torn it down already
+            self.teardown()
         logging.debug('killed server object for ' + self.__repr__())
@@ -1,27 +1,20 @@
-import asyncio
-import datetime
 import logging
-import socket
-import textwrap as tw
-from collections import Counter
-from typing import List, Optional
+from typing import List
 
-import hikari
-import mcrcon
-import regex
 from docker.models.containers import Container
-from hikari.errors import ForbiddenError
-from mcstatus import MinecraftServer as mc
 
 from OGBotPlus import OGBotPlus
+from utils import minecraft_chat
 from utils.servers.docker_base import BaseDockerServer
+from utils.servers.minecraft import MinecraftMixin
 
 
-class MinecraftDockerServer(BaseDockerServer):
+class MinecraftDockerServer(MinecraftMixin, BaseDockerServer):
 
     def __init__(self, bot: OGBotPlus, process: Container, **kwargs):
         logging.debug("initialized dockerized minecraft server")
         super().__init__(bot, process, **kwargs)
+        self.outbox = minecraft_chat.chat_outbox(self.rcon, self.bot.cfg, self._delivery_failed)
         self.bot.loop.create_task(self.chat_from_game_to_guild())
         self.bot.loop.create_task(self.chat_from_guild_to_game())
         self.bot.loop.create_task(self.update_server_information())
@@ -29,197 +22,23 @@ class MinecraftDockerServer(BaseDockerServer):
         self.motd: str = kwargs.pop('motd', "A Dockerized Minecraft Server")
         self._repr = "MC"
 
-    async def _rcon_connect(self):
-        logging.debug("rcon_connect")
-        if not self.rcon:
-            self.rcon = mcrcon.MCRcon(self.ip, self.password, port=self.rcon_port)
-        try:
-            connection_length = (datetime.datetime.now() - self.last_reconnect)
-            async with self.rcon_lock:
-                if connection_length.total_seconds() >= 600:
-                    try:
-                        self.rcon.connect()
-                        self.last_reconnect = datetime.datetime.now()
-                    except mcrcon.MCRconException as e:
-                        logging.error(e)
-        except Exception as e:
-            logging.error(e)
-            pass
-
     async def process_server_messages(self, out: List[str]):
-        server_filter = regex.compile(
-            r"INFO\]:?(?:.*tedServer\]:)? (\[[^\]]*: .*\].*|(?<=]:\s).* the game|.* has (?:made|completed|reached) the .*)")
-        player_filter = regex.compile(r"FO\]:?(?:.*tedServer\]:)? (\[Server\].*|<.*>.*|\*\s.*?\s.*)")
-        death_filter = regex.compile(
-            r"FO\]:?(?:.*tedServer\]:)? ([\w_]+) (died|drowned|blew up|fell|burned|froze|starved|suffocated|withered|walked into a cactus|experienced kinetic energy|discovered (?:the )?floor was lava|tried to swim in lava|hit the ground|didn't want to live|went (?:up in flames|off with a bang)|walked into (?:fire|danger)|was (?:killed|shot|slain|pummeled|pricked|blown up|impaled|squashed|squished|skewered|poked|roasted|burnt|frozen|struck by lightning|fireballed|stung|doomed))\s(.*)")
-        msgs = []
-        mentioned_users = []
-        for line in out:
-            raw_player_msg: List[Optional[str]] = regex.findall(player_filter, line)
-            raw_server_msg: List[Optional[str]] = regex.findall(server_filter, line)
-            raw_deathr_msg: List[Optional[str]] = regex.findall(death_filter, line)
-
-            if raw_player_msg:
-                ret = self.check_for_mentions(raw_player_msg[0])
-                mentioned_users += ret[0]
-                msgs.append((ret[1], mentioned_users))
-            elif raw_server_msg:
-                msgs.append((f'`{raw_server_msg[0].rstrip()}`', None))
-            elif raw_deathr_msg:
-                skull = '\N{SKULL}'
-                msgs.append((f'{skull} {" ".join(raw_deathr_msg[0])} {skull}', None))
-            else:
-                continue
-        if msgs:
-            # TODO: Limit this to 2000 characters, though it will never be a problem even on a rather large server
-            x = "\n".join(list(zip(*msgs))[0])  # joins all messages into a single string to reduce total msgs sent
-            for chan in self.bot.chat_channels_obj:
-                await chan.send(x, user_mentions=mentioned_users)
+        msgs, mentioned_users = self.parse_log_lines(out)
+        self.bot.relay.publish(msgs, mentioned_users)
         for msg in msgs:
-            self.bot.bprint(f"{self._repr} | {''.join(msg[0])}")
-
-    def remove_nestings(self, iterable):
-        output = []
-        for i in iterable:
-            if type(i) == list:
-                output.extend(self.remove_nestings(i))
-            else:
-                output.append(i)
-        return output
+            self.bot.bprint(f"{self._repr} | {msg}")
 
     async def chat_from_guild_to_game(self):
-        msg: hikari.events.GuildMessageCreateEvent
-        while self.is_running() and self.bot.is_alive:
-            try:
-                msg = await self.bot.wait_for(hikari.events.GuildMessageCreateEvent, predicate=self.is_chat_channel,
-                                              timeout=5)
-            except asyncio.exceptions.TimeoutError:
-                continue
+        async for msg in self.guild_messages():
             try:
-                if not hasattr(msg, 'author') or (hasattr(msg, 'author') and msg.author.is_bot):
-                    pass
-                elif msg.content:
-
-                    content = regex.sub(r'<(:\w+:)\d+>', r'\1', msg.content).split('\n')  # split on msg newlines
-                    content = self.generate_valid_message(msg, content)
-
-                    await self.send_game_message(content)
-
-                    self.bot.bprint(f"Discord | <{msg.author.username}>: {' '.join(content)}")
-                if msg.message.attachments and not msg.author.is_bot:
-                    cnt = []
-                    for att in msg.message.attachments:
-                        cnt.append(att.extension) if att.extension else cnt.append('file(s) with no extension')
-                    cnt.sort()
-                    files = [(k, cnt.count(k)) for k, v in Counter(cnt).most_common()]
-
-                    data = f"§l[sent "
-                    if len(files) > 1:
-                        for k, v in files[:-1]:
-                            data += f"a {k}, " if v == 1 else f"{v} {k}s, "
-                        for k, v in files[-1:]:
-                            data += f"and a {k}" if v == 1 else f"and {v} {k}"
-                    else:
-                        for k, v in files:
-                            data += f"a {k}" if v == 1 else f"{v} {k}s"
-                    data += ']'
-                    content = self.generate_valid_message(msg, [data])
-
-                    await self.send_game_message(content)
-            except mcrcon.MCRconException as e:
-                logging.error(e)
-                await asyncio.sleep(2)
-            except socket.error as e:
-                logging.error(e)
-                for chan in self.bot.chat_channels_obj:
-                    if chan.channel_id == msg.channel_id:
-                        await chan.send("Message failed to send; the bot is broken, tag Evan",
-                                        delete_after=10)
-                continue
-            except AttributeError as e:
-                logging.critical(e, exc_info=True)
+                if msg.author.is_bot:
+                    continue
+                self.outbox.put(minecraft_chat.chat_payload(msg, self.bot.cfg), origin=msg.channel_id)
+                if msg.content:
+                    self.bot.bprint(f"Discord | <{msg.author.username}>: {msg.content}")
             except Exception as e:
                 logging.critical("guild2server catchall:")
                 logging.critical(e, exc_info=True)
 
-    def generate_valid_message(self, event, content: list):
-        long = False
-        for index, line in enumerate(content):
-            data = f"§9§l{event.author.username}§r: {line}"
-            if len(data) >= 100:
-                # if length of prefix + msg > 100 chars...
-                if index == 0:
-                    # ...and current line is the first line, split the line, adding a prefix...
-                    content[index] = tw.wrap(line, 90, initial_indent=f"§9§l{event.author.username}§r: ")
-                else:
-                    # ...else, just split the line, without the prefix.
-                    content[index] = tw.wrap(line, 90)
-                long = True
-            elif index == 0:
-                # ...else, if less than 100 chars and on the first line, set to data variable
-                content[index] = data
-            else:
-                # ...else, just return the line
-                content[index] = line
-        if long:
-            # flatten list into a single layer
-            content = self.remove_nestings(content)
-        return content
-
-    async def send_game_message(self, content: List[str]):
-        await self._rcon_connect()
-
-        async with self.rcon_lock:
-            for line in content:
-                self.rcon.command(f"say {line}")
-
     async def update_server_information(self):
-        tries = 1
-        server = mc.lookup(f"{self.ip}:{self.port}")
-        while self.is_running() and self.bot.is_alive:
-            failed = False
-            try:
-                await asyncio.sleep(10)
-                stats = server.status()
-                version, online, max_p = stats.version.name, stats.players.online, stats.players.max
-                names = []
-                if 'sample' in stats.raw['players']:
-                    for x in stats.raw['players']['sample']:
-                        names.append(x['name'])
-                    names.sort()
-                if 'modinfo' in stats.raw:
-                    mod_count = f"{len(stats.raw['modinfo']['modList'])} mods installed"
-                else:
-                    mod_count = 'Vanilla'
-                if failed:
-                    stats = server.query()
-                    version, online, max_p = stats.software.version, stats.players.online, stats.players.max
-                player_count = f"({online}/{max_p} players)" if not failed else ""
-                cur_status = f"Minecraft {version} {player_count} {'[' if names else ''}{', '.join(names)}{']' if names else ''}"
-                await self.bot.add_game_chat_info(self.name, cur_status)
-                await self.bot.add_game_presence(self.name, f'{self._repr} {version} {mod_count} {player_count}')
-            except BrokenPipeError:
-                logging.error("Server running a MC version <1.7, or is still starting. (BrokenPipeError)")
-                await self.sleep_with_backoff(tries)
-                tries += 1
-                pass
-            except ConnectionRefusedError:
-                logging.error("Server running on incorrect port. (ConnectionRefusedError)")
-                break
-            except ConnectionResetError:
-                logging.error("Connection to server was reset by peer. (ConnectionResetError)")
-                pass
-            except ConnectionError:
-                logging.error("General Connection Error. (ConnectionError)")
-            except socket.timeout:
-                logging.error("Server not responding. (socket.timeout)")
-            except ForbiddenError:
-                logging.error("Bot lacks permissions to edit channels. (hikari.ForbiddenError)")
-                pass
-            except NameError:
-                pass
-            except Exception as e:
-                logging.error(f"Failed with Exception {e}")
-                pass
-            finally:
-                await asyncio.sleep(30)
+        self.poll_status()
@@ -0,0 +1,95 @@
+import importlib
+import logging
+from typing import Dict, Iterable, List, Optional, Pattern, Type
+
+import regex
+
+COMPOSE_SERVICE_LABEL = 'com.docker.compose.service'
+
+
+def _alternation(words: Iterable[str]) -> Optional[Pattern]:
+    words = list(words)
+    if not words:
+        return None
+    return regex.compile('|'.join(regex.escape(w.lower()) for w in words))
+
+
+class ServerAdapter:
+    """A server class plus the rules that pick it. The class's module is imported on first match only.
+
+    An adapter matches a server when any of these holds:
+      * its gameinfo 'game' is one of `games`
+      * its compose service label contains one of `services`
+      * its executable contains one of `executables`, and its cmdline contains one of `cmdline` (if given)
+      * no `executables` are given and its cmdline contains one of `cmdline`
+      * its port is one of `ports`
+    """
+
+    def __init__(self, name: str, target: str, kind: str, executables: Iterable[str] = (),
+                 cmdline: Iterable[str] = (), services: Iterable[str] = (), games: Iterable[str] = (),
+                 ports: Iterable[int] = ()):
+        self.name = name
+        self.target = target  # "package.module:ClassName"
+        self.kind = kind  # 'process' or 'container'
+        self.games = frozenset(g.lower() for g in games)
+        self.ports = frozenset(int(p) for p in ports)
+        self._executables = _alternation(executables)
+        self._cmdline = _alternation(cmdline)
+        self._services = _alternation(services)
+        self._cls = None
+
+    def matches(self, kind: str, gameinfo: dict, labels: Optional[Dict[str, str]] = None,
+                port: Optional[int] = None) -> bool:
+        if kind != self.kind:
+            return False
+        if str(gameinfo.get('game', '')).lower() in self.games:
+            return True
+        if self._services and labels and self._services.search(labels.get(COMPOSE_SERVICE_LABEL, '').lower()):
+            return True
+        if self._executables is None or self._executables.search(str(gameinfo.get('executable', '')).lower()):
+            if self._executables is not None and not self._cmdline:
+                return True
+            command = gameinfo.get('command', '')
+            command = ' '.join(command) if isinstance(command, list) else str(command)
+            if self._cmdline and self._cmdline.search(command.lower()):
+                return True
+        return port is not None and int(port) in self.ports
+
+    def load(self) -> Type:
+        if self._cls is None:
+            module_name, class_name = self.target.split(':')
+            self._cls = getattr(importlib.import_module(module_name), class_name)
+            logging.info(f"Loaded server adapter {self.name} ({self.target})")
+        return self._cls
+
+    def __repr__(self):
+        return f"<ServerAdapter {self.name} -> {self.target}>"
+
+
+class ServerTypeRegistry:
+    def __init__(self):
+        self.adapters: List[ServerAdapter] = []
+
+    def register(self, name: str, target: str, kind: str, **rules) -> ServerAdapter:
+        adapter = ServerAdapter(name, target, kind, **rules)
+        self.adapters.append(adapter)
+        return adapter
+
+    def find(self, kind: str, gameinfo: dict, labels: Optional[Dict[str, str]] = None,
+             port: Optional[int] = None) -> Optional[ServerAdapter]:
+        for adapter in self.adapters:
+            if adapter.matches(kind, gameinfo, labels, port):
+                return adapter
+        return None
+
+
+# checked in order; first match wins
+server_types = ServerTypeRegistry()
+server_types.register('source', 'utils.servers.source:SourceServer', 'process',
+                      executables=('srcds',))
+server_types.register('minecraft', 'utils.servers.minecraft:MinecraftServer', 'process',
+                      games=('minecraft',), executables=('java',), cmdline=('forge',))
+server_types.register('minecraft-jar', 'utils.servers.minecraft:MinecraftServer', 'process',
+                      cmdline=('server.jar', 'nogui'))  # whatever runs it
+server_types.register('minecraft-docker', 'utils.servers.docker_minecraft:MinecraftDockerServer', 'container',
+                      services=('minecraft',))
@@ -1,15 +1,16 @@
 import asyncio
+import logging
 import textwrap as tw
+from typing import List
 
+import hikari
 import psutil
-import regex
-import valve.rcon as valvercon
-from hikari.errors import ForbiddenError
-from hikari.events import GuildMessageCreateEvent
 
+from utils import logparse
+from utils.rcon import RconOutbox
+from utils.relay import RelayLine
 from utils.servers.a2s_compatible import A2SCompatibleServer
-
-valvercon.RCONMessage.ENCODING = "utf-8"
+from utils.status import ServerStatus, a2s_status
 
 
 class SourceServer(A2SCompatibleServer):
@@ -18,163 +19,99 @@ class SourceServer(A2SCompatibleServer):
         self.bot.loop.create_task(self.chat_from_game_to_guild())
         self.bot.loop.create_task(self.chat_from_guild_to_game())
         self.bot.loop.create_task(self.update_server_information())
-        self.log = list()
-        self.log_lock = asyncio.Lock()
-        self.bot.loop.create_task(self._log_loop())
+        # srcds sends its log from the game port; `logaddress_add <local_ip>:<srcds_log_port>` points it at the bot
+        self.log = self.bot.srcds_log_listener.register((self.bot.cfg["local_ip"], self.port),
+                                                        secret=kwargs.pop('log_secret', None))
         self._repr = "Source"
         self.readable_name = kwargs.setdefault('name', 'Source Server')
+        # guild chat goes out through here, so a restarting server can't hold up the loop
+        self.outbox = RconOutbox(self.rcon, on_failure=self._delivery_failed)
 
         self.loop.create_task(self.wait_for_death())
 
-    async def _log_loop(self):
-        port = 22242
-
-        transport, protocol = await self.bot.loop.create_datagram_endpoint(
-            lambda: SrcdsLoggingProtocol(self.bot.loop.create_task, self._log_callback),
-            local_addr=(self.bot.cfg["local_ip"], port))
+    def rcon_host(self) -> str:
+        # srcds is reached on the configured local_ip, like its log and A2S queries
+        return self.bot.cfg["local_ip"]
 
-        try:
-            await self.bot.wait_until_game_stopped()
-        finally:
-            transport.close()
-
-    async def _log_callback(self, message):
-        async with self.log_lock:
-            self.log.append(message)
+    @staticmethod
+    def parse_log_lines(lines: List[str]) -> List[str]:
+        msgs = list()
+        for line in lines:
+            event = logparse.classify_source(line)
+            if event is None:
+                continue
+            if event.kind == logparse.CHAT:
+                msgs.append(RelayLine(event.text, event.player, f"{'[TEAM] ' if event.team else ''}{event.body}"))
+            else:
+                msgs.append(logparse.relay_text(event))
+        return msgs
 
     async def chat_from_game_to_guild(self):
-        connections = regex.compile(
-            r"""(?<=: ")([\w\s]+)(<\d><(?:STEAM_0:\d:\d+|\[U:\d:\d+\])><.*>)" (?:((?:dis)?connected),? (?|address "(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}:\d{2,5})|(\(reason ".+"?)))""")
-        chat = regex.compile(
-            r"""(?<=: ")([\w\s]+)(?:<\d+><(?:STEAM_0:\d:\d+|Console|\[U:\d:\d+\])><.*>)" (|say|say_team) "(?!\|D> )(.*)\"""")
-        while self.bot.is_game_running:
+        dropped = 0
+        # ends at teardown, which unregisters the log buffer this waits on
+        while self.is_running() and self.bot.is_alive:
             try:
-                lines = []
-                async with self.log_lock:
-                    if self.log:
-                        lines = self.log
-                        self.log = []
-                msgs = list()
-                for line in lines:
-                    raw_connectionmsg = connections.findall(line)
-                    raw_chatmsg = chat.findall(line)
-                    # print('DEBUG: Chat Message: ', *raw_chatmsg) if self.bot.debug else False
-                    # print('DEBUG: Connection Message: ', *raw_connectionmsg) if self.bot.debug else False
-
-                    if raw_chatmsg:
-                        msgs.append(
-                            f"{'[TEAM] ' if raw_chatmsg[0][1] == 'say_team' else ''} *[{raw_chatmsg[0][0]}]*: {raw_chatmsg[0][2]}")
-                    elif raw_connectionmsg:
-                        msgs.append(f"`{' '.join(raw_connectionmsg[0])}`")
-                    else:
-                        continue
+                if not await self.log.wait(timeout=5):
+                    continue
+                lines = self.log.drain()
+                if self.log.dropped != dropped:
+                    logging.warning(f"{self._repr} | log buffer full, dropped {self.log.dropped - dropped} line(s)")
+                    dropped = self.log.dropped
+                msgs = self.parse_log_lines(lines)
                 # print('DEBUG: list `msgs`: ', *msgs) if self.bot.debug else False
-                if msgs:
-                    x = "\n".join(msgs)
-                    for chan in self.bot.chat_channels_obj:
-                        await chan.send(x)
+                self.bot.relay.publish(msgs)
                 for msg in msgs:
-                    self.bot.bprint(f"{self.bot.games[str(self.port)]} | {''.join(msg)}")
+                    self.bot.bprint(f"{self} | {''.join(msg)}")
                 continue
             except Exception as e:
                 print(f"Caught Unexpected {type(e)}: ({str(e)}) (Source Server Game2Guild)")
-            finally:
                 await asyncio.sleep(.75)
 
-    async def chat_from_guild_to_game(self):
-        with valvercon.RCON((self.bot.cfg["local_ip"], self.rcon_port), self.password) as rcon:
-            while self.proc.is_running() and self.bot.is_alive:
-                try:
-                    msg = await self.bot.wait_for(GuildMessageCreateEvent, predicate=self.is_chat_channel, timeout=5)
-                    if not hasattr(msg, 'author') or (hasattr(msg, 'author') and msg.author.is_bot):
-                        pass
-                    elif msg.content:
-                        i = len(msg.author.username)
-                        # if message is longer than 200-some characters
-                        if len(msg.content) > 230 - i:
-                            wrapped = tw.wrap(msg.content, width=230 - i,
-                                              initial_indent=f"{msg.author.username}: ")
-                            for wrapped_line in wrapped:
-                                rcon(f"say |D> {wrapped_line}")
-                        # elif shorter than 200-some characters
-                        else:
-                            rcon(f"say |D> {msg.author.username}: {msg.content}")
-                        self.bot.bprint(f"Discord | <{msg.author.username}>: {msg.content}")
-                    if msg.attachments:
-                        rcon.command(f"say |D> {msg.author.username}: Image {msg.attachments[0]['filename']}")
-                        self.bot.bprint(
-                            f"Discord | {msg.author.username}: Image {msg.attachments[0]['filename']}")
-                except asyncio.exceptions.TimeoutError:
-                    pass
-                except Exception as e:
-                    print(f"Caught Unexpected {type(e)}: ({str(e)}) (Source Server Guild2Game)")
+    @staticmethod
+    def game_lines(msg: hikari.GuildMessageCreateEvent) -> List[str]:
+        lines = []
+        if msg.content:
+            i = len(msg.author.username)
+            # if message is longer than 200-some characters
+            if len(msg.content) > 230 - i:
+                lines += tw.wrap(msg.content, width=230 - i, initial_indent=f"{msg.author.username}: ")
+            # elif shorter than 200-some characters
+            else:
+                lines.append(f"{msg.author.username}: {msg.content}")
+        if msg.message.attachments:
+            lines.append(f"{msg.author.username}: Image {msg.message.attachments[0].filename}")
+        return lines
 
-    async def update_server_information(self):
-        while self.proc.is_running() and self.bot.is_alive:
+    async def chat_from_guild_to_game(self):
+        async for msg in self.guild_messages():
             try:
-                info = await a2s.ainfo((self.bot.cfg["local_ip"], self.query_port))
+                if not hasattr(msg, 'author') or (hasattr(msg, 'author') and msg.author.is_bot):
+                    continue
+                lines = self.game_lines(msg)
+                self.outbox.put([f"say |D> {line}" for line in lines], origin=msg.channel_id)
+                if msg.content:
+                    self.bot.bprint(f"Discord | <{msg.author.username}>: {msg.content}")
+            except Exception as e:
+                print(f"Caught Unexpected {type(e)}: ({str(e)}) (Source Server Guild2Game)")
 
-                mode = info.game
-                cur_map = info.map
-                cur_p = info.player_count
-                max_p = info.max_players
-                cur_status = f"Playing: {self.readable_name} - {mode} on map {cur_map} ({cur_p}/{max_p} players)"
-                await self.bot.add_game_chat_info(self.name, cur_status)
-                status = f"""
+    async def update_server_information(self):
+        self.poll_status()
+
+    async def query_status(self) -> ServerStatus:
+        return await a2s_status(self.bot.cfg["local_ip"], self.query_port, self.bot.status_scheduler.timeout)
+
+    async def status_changed(self, status: ServerStatus):
+        if not status.online:
+            print(f"{self._repr} | Status query failed: {status.error}")
+            return
+        cur_p, max_p = status.players, status.max_players
+        cur_status = f"Playing: {self.readable_name} - {status.game} on map {status.map} ({cur_p}/{max_p} players)"
+        await self.bot.add_game_chat_info(self.name, cur_status)
+        await self.bot.add_game_presence(self.name, f"""
 {self.readable_name} 
 ({cur_p} player{'s' if cur_p != 1 else ''}) 
-CPU: {self.proc.cpu_percent()}% 
-Mem: {round(self.proc.memory_percent(), 2)}% 
-"""
-                await self.bot.add_game_presence(self.name, status)
-            except ForbiddenError:
-                print("Bot lacks permission to edit channels. (hikari.ForbiddenError)")
-            except a2s.BufferExhaustedError:
-                print("Buffer Exhausted (a2s.BufferExhaustedError)")
-            except a2s.BrokenMessageError:
-                print("Broken Message (a2s.BrokenMessageError)")
-            except Exception as e:
-                print(f"Error: {e} ({type(e)})")
-            await asyncio.sleep(30)
-
-
-class SrcdsLoggingProtocol(asyncio.DatagramProtocol):
-
-    def __init__(self, cb1, cb2):
-        self.callback1 = cb1
-        self.callback2 = cb2
-
-    def connection_made(self, transport):
-        print("Connected to Server")
-        # noinspection PyAttributeOutsideInit
-        self.transport = transport
-
-    def datagram_received(self, packet, addr):
-        message = self.parse(packet)
-        self.callback1(self.callback2(message))
-
-    @staticmethod
-    def parse(packet: bytes):
-        packet_len = len(packet)
-
-        if packet_len < 7:
-            raise Exception("Packet is too short")
-
-        for i in range(4):
-            if packet[i] != int(0xFF):
-                raise Exception('invalid header value')
-
-        if packet[packet_len - 1] != int(0x00):
-            raise Exception('invalid footer value')
-
-        ptype, offset, footer = packet[4], 5, 2
-
-        if packet[packet_len - 2] != int(0x0a):
-            footer = 1
-
-        if ptype != int(0x52):
-            raise Exception('invalid packet type ' + hex(ptype))
-
-        message = packet[offset:(packet_len - footer)]
+""")
 
-        return message.decode('utf-8').strip()
+    def teardown(self):
+        self.bot.srcds_log_listener.unregister(self.log)
+        super().teardown()
@@ -0,0 +1,174 @@
+import asyncio
+import collections
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from utils.logparse import SOURCE_PREFILTER_BYTES
+
+PACKET_HEADER = b'\xff\xff\xff\xff'
+PTYPE_LOG = 0x52  # 'R', a plain log line
+PTYPE_SECRET_LOG = 0x53  # 'S', a log line prefixed with the server's sv_logsecret
+DEFAULT_LOG_PORT = 22242
+
+
+class LogRingBuffer:
+    """Fixed-capacity queue of log lines. When full the oldest line is dropped and counted."""
+
+    def __init__(self, capacity: int = 1024):
+        self._lines = collections.deque(maxlen=capacity)
+        self.ready = asyncio.Event()
+        self.received = 0
+        self.dropped = 0
+
+    def push(self, line: str):
+        if len(self._lines) == self._lines.maxlen:
+            self.dropped += 1
+        self._lines.append(line)
+        self.received += 1
+        self.ready.set()
+
+    def drain(self) -> List[str]:
+        lines = list(self._lines)
+        self._lines.clear()
+        self.ready.clear()
+        return lines
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def __len__(self):
+        return len(self._lines)
+
+
+def payload_bounds(view: memoryview) -> Optional[Tuple[int, int, Optional[bytes]]]:
+    """Start/end of the log line inside a srcds log packet and its log secret, or None if it isn't one."""
+    packet_len = len(view)
+    if packet_len < 7 or view[:4] != PACKET_HEADER or view[packet_len - 1] != 0x00:
+        return None
+    end = packet_len - 2 if view[packet_len - 2] == 0x0a else packet_len - 1
+    if view[4] == PTYPE_LOG:
+        return 5, end, None
+    if view[4] == PTYPE_SECRET_LOG:
+        # the secret runs up to the "L " that starts every log line
+        start = view.obj.find(b'L ', 5, end)
+        if start == -1:
+            return None
+        return start, end, bytes(view[5:start])
+    return None
+
+
+class SrcdsLogListener:
+    """One UDP log endpoint for the whole bot, demultiplexing srcds log packets to per-server ring buffers.
+
+    Packets are routed by sv_logsecret when the server sets one, then by exact sender address, then by sender host
+    when only one server on that host is registered (or to the only server at all). The socket is bound while at
+    least one server is registered.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, local_ip: str, port: int = DEFAULT_LOG_PORT):
+        self.loop = loop
+        self.local_addr = (local_ip, port)
+        self.unrouted = 0
+        self._by_secret: Dict[bytes, LogRingBuffer] = {}
+        self._by_addr: Dict[Tuple[str, int], LogRingBuffer] = {}
+        self._by_host: Dict[str, List[LogRingBuffer]] = {}
+        self._registrations: Dict[int, Tuple[Tuple[str, int], Optional[bytes]]] = {}
+        self._transport = None
+        self._binding: Optional[asyncio.Task] = None
+
+    def register(self, addr: Tuple[str, int], secret: Optional[str] = None, capacity: int = 1024) -> LogRingBuffer:
+        buffer = LogRingBuffer(capacity)
+        addr = (addr[0], int(addr[1]))
+        secret_key = secret.encode() if secret else None
+        if secret_key:
+            self._by_secret[secret_key] = buffer
+        self._by_addr[addr] = buffer
+        self._by_host.setdefault(addr[0], []).append(buffer)
+        self._registrations[id(buffer)] = (addr, secret_key)
+        if self._transport is None and (self._binding is None or self._binding.done()):
+            self._binding = self.loop.create_task(self._bind())
+        return buffer
+
+    def unregister(self, buffer: LogRingBuffer):
+        registration = self._registrations.pop(id(buffer), None)
+        if registration is None:
+            return
+        addr, secret_key = registration
+        if secret_key and self._by_secret.get(secret_key) is buffer:
+            del self._by_secret[secret_key]
+        if self._by_addr.get(addr) is buffer:
+            del self._by_addr[addr]
+        host_buffers = self._by_host.get(addr[0], [])
+        if buffer in host_buffers:
+            host_buffers.remove(buffer)
+        if not host_buffers:
+            self._by_host.pop(addr[0], None)
+        if not self._registrations:
+            self.close()
+
+    def route(self, addr: Tuple[str, int], secret: Optional[bytes]) -> Optional[LogRingBuffer]:
+        if secret is not None:
+            return self._by_secret.get(secret)
+        buffer = self._by_addr.get((addr[0], addr[1]))
+        if buffer is None:
+            host_buffers = self._by_host.get(addr[0])
+            if host_buffers and len(host_buffers) == 1:
+                buffer = host_buffers[0]
+            elif len(self._by_addr) == 1:  # a single server can't be mixed up with anything
+                buffer = next(iter(self._by_addr.values()))
+        return buffer
+
+    def close(self):
+        if self._binding is not None and not self._binding.done():
+            self._binding.cancel()
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def _bind(self):
+        try:
+            self._transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: SrcdsLoggingProtocol(self), local_addr=self.local_addr)
+        except OSError as e:
+            logging.error(f"Couldn't bind the srcds log listener to {self.local_addr}: {e}")
+            return
+        if not self._registrations:  # everyone left while binding
+            self.close()
+
+
+class SrcdsLoggingProtocol(asyncio.DatagramProtocol):
+    """Pushes srcds log lines straight into their server's ring buffer: no task, lock or copy per datagram.
+
+    Lines that can't be relayed (see logparse.SOURCE_PREFILTER) are never decoded.
+    """
+
+    def __init__(self, listener: SrcdsLogListener):
+        self.listener = listener
+        self.invalid = 0
+        self.filtered = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        print(f"Listening for srcds logs on {self.listener.local_addr}")
+        self.transport = transport
+
+    def datagram_received(self, packet, addr):
+        view = memoryview(packet)
+        bounds = payload_bounds(view)
+        if bounds is None:
+            self.invalid += 1
+            logging.debug(f"Ignored a malformed srcds log packet from {addr}")
+            return
+        start, end, secret = bounds
+        if not any(packet.find(word, start, end) != -1 for word in SOURCE_PREFILTER_BYTES):
+            self.filtered += 1
+            return
+        buffer = self.listener.route(addr, secret)
+        if buffer is None:
+            self.listener.unrouted += 1
+            return
+        buffer.push(str(view[start:end], 'utf-8', 'replace').strip())
@@ -0,0 +1,186 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class ServerStatus(NamedTuple):
+    online: bool
+    players: int = 0
+    max_players: int = 0
+    names: Tuple[str, ...] = ()  # of the players online, where the game tells us
+    version: str = ''
+    game: str = ''  # A2S game description, e.g. the mode
+    map: str = ''
+    mods: Optional[int] = None  # Forge mod count; None on a vanilla server
+    latency: float = 0.0  # seconds the query took
+    error: str = ''
+    checked_at: float = 0.0
+
+
+Probe = Callable[[], Awaitable[ServerStatus]]
+StatusCallback = Callable[[ServerStatus], Awaitable[None]]
+
+
+async def minecraft_status(host: str, port: int, query_port: Optional[int] = None) -> ServerStatus:
+    """Server List Ping, falling back to a GS4 query on `query_port` for servers that don't answer it
+    (older than 1.7, or still starting)."""
+    from mcstatus import MinecraftServer  # only once a Minecraft server is polled, like the adapter itself
+
+    try:
+        stats = await MinecraftServer(host, port).async_status(tries=1)
+    except (OSError, ValueError):
+        if query_port is None:
+            raise
+        query = await MinecraftServer(host, query_port).async_query(tries=1)
+        return ServerStatus(True, query.players.online, query.players.max, tuple(sorted(query.players.names)),
+                            query.software.version)
+    raw = stats.raw
+    names = tuple(sorted(player['name'] for player in raw['players'].get('sample', ())))
+    mods = len(raw['modinfo']['modList']) if 'modinfo' in raw else None
+    return ServerStatus(True, stats.players.online, stats.players.max, names, stats.version.name, mods=mods)
+
+
+async def a2s_status(host: str, port: int, timeout: float = 5.0) -> ServerStatus:
+    import a2s
+
+    info = await a2s.ainfo((host, port), timeout=timeout)
+    return ServerStatus(True, info.player_count, info.max_players, version=info.version, game=info.game,
+                        map=info.map_name)
+
+
+def _unchanged(a: ServerStatus, b: ServerStatus) -> bool:
+    return a._replace(latency=0.0, checked_at=0.0) == b._replace(latency=0.0, checked_at=0.0)
+
+
+class _Entry:
+    __slots__ = ('key', 'probe', 'on_status', 'failures', 'idle', 'due', 'polling')
+
+    def __init__(self, key, probe: Probe, on_status: Optional[StatusCallback]):
+        self.key = key
+        self.probe = probe
+        self.on_status = on_status
+        self.failures = 0  # unanswered polls in a row
+        self.idle = 0  # empty polls in a row
+        self.due = 0.0
+        self.polling = False
+
+
+class StatusScheduler:
+    """Polls every registered server's status from one task, keeping the latest ServerStatus per server in
+    `statuses`.
+
+    A server is polled every `interval` seconds, or every `active_interval` while players are on. Each poll of an
+    empty server stretches its interval by half, and each failed one doubles it, up to `max_interval`; the first
+    answer with players on resets it. Every interval is jittered by +-`jitter` so servers started together don't
+    query in lockstep, and a poll that takes longer than `timeout` counts as failed. A server's callback is only
+    called when its status differs from the last one in more than latency and time.
+    """
+
+    def __init__(self, interval: float = 30.0, active_interval: float = 10.0, max_interval: float = 300.0,
+                 timeout: float = 5.0, jitter: float = 0.1):
+        self.interval = interval
+        self.active_interval = active_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.jitter = jitter
+        self.statuses: Dict[object, ServerStatus] = {}
+        self._entries: Dict[object, _Entry] = {}
+        self._heap: List[Tuple[float, int, _Entry]] = []
+        self._order = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.failures = 0
+
+    def register(self, key, probe: Probe, on_status: Optional[StatusCallback] = None, delay: float = 0.0):
+        """Starts polling `probe` for `key`, first after `delay` seconds; registering a key again replaces it."""
+        self.unregister(key)
+        entry = self._entries[key] = _Entry(key, probe, on_status)
+        self._schedule(entry, delay)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def unregister(self, key):
+        self._entries.pop(key, None)
+        self.statuses.pop(key, None)
+
+    def get(self, key) -> Optional[ServerStatus]:
+        return self.statuses.get(key)
+
+    def _schedule(self, entry: _Entry, delay: float):
+        entry.due = time.monotonic() + delay
+        self._order += 1
+        heapq.heappush(self._heap, (entry.due, self._order, entry))
+        self._wake.set()
+
+    def next_interval(self, entry: _Entry, status: ServerStatus) -> float:
+        if not status.online:
+            entry.failures += 1
+            base = self.interval * 2 ** min(entry.failures, 16)
+        elif status.players:
+            entry.failures = entry.idle = 0
+            base = self.active_interval
+        else:
+            entry.failures = 0
+            entry.idle += 1
+            base = self.interval * 1.5 ** min(entry.idle - 1, 16)
+        base = min(base, self.max_interval)
+        return base * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _run(self):
+        while self._entries:
+            now = time.monotonic()
+            while self._heap and (self._heap[0][2].key not in self._entries
+                                  or self._entries[self._heap[0][2].key] is not self._heap[0][2]):
+                heapq.heappop(self._heap)  # unregistered or replaced
+            if self._heap and self._heap[0][0] <= now:
+                _, _, entry = heapq.heappop(self._heap)
+                if not entry.polling:
+                    entry.polling = True
+                    asyncio.ensure_future(self._poll(entry))
+                continue
+            self._wake.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, entry: _Entry):
+        start = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(entry.probe(), self.timeout)
+        except asyncio.TimeoutError:
+            status = ServerStatus(False, error=f"no answer within {self.timeout}s")
+        except Exception as e:
+            status = ServerStatus(False, error=f"{type(e).__name__}: {e}")
+        status = status._replace(latency=time.perf_counter() - start, checked_at=time.time())
+        self.polls += 1
+        if not status.online:
+            self.failures += 1
+        entry.polling = False
+        if self._entries.get(entry.key) is not entry:
+            return
+        previous = self.statuses.get(entry.key)
+        self.statuses[entry.key] = status
+        self._schedule(entry, self.next_interval(entry, status))
+        if previous is not None and _unchanged(previous, status):
+            return
+        if entry.on_status is not None:
+            try:
+                await entry.on_status(status)
+            except Exception as e:
+                logging.error(f"Status update for {entry.key} failed: {type(e).__name__}: {e}")
+
+    def close(self):
+        self._entries.clear()
+        self.statuses.clear()
+        self._heap.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+    def __repr__(self):
+        return f"StatusScheduler(servers={len(self._entries)} polls={self.polls} failures={self.failures})"
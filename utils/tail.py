@@ -0,0 +1,186 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from os import path
+from typing import AsyncIterator, List, Optional
+
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CREATE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+    return _libc
+
+
+class InotifyWaker:
+    """Sets an event whenever `name` inside `directory` is written, created, moved or deleted."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, directory: str, name: str):
+        libc = _load_libc()
+        self.loop = loop
+        self.name = os.fsencode(name)
+        self.event = asyncio.Event()
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+        loop.add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self):
+        wake = False
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(buf):
+                _, mask, _, length = EVENT_HEADER.unpack_from(buf, offset)
+                name = buf[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+                offset += EVENT_HEADER.size + length
+                if name == self.name or mask & (IN_Q_OVERFLOW | IN_MOVE_SELF):
+                    wake = True
+        if wake:
+            self.event.set()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.event.clear()
+
+    def close(self):
+        self.loop.remove_reader(self.fd)
+        os.close(self.fd)
+
+
+class FileTailer:
+    """Follows a log file by path, across rotation, yielding only complete lines.
+
+    Wakes on inotify events for the file where available, otherwise polls with a backoff between
+    `min_interval` and `max_interval` that resets whenever something new is read. Iteration ends once
+    `until` resolves or `stop()` is called.
+    """
+
+    def __init__(self, file_path: str, from_end: bool = True, min_interval: float = 0.05,
+                 max_interval: float = 2.0, max_line: int = 16384, until: Optional[asyncio.Future] = None):
+        self.file_path = file_path
+        self.from_end = from_end
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_line = max_line
+        self._file = None
+        self._partial = bytearray()
+        self._waker: Optional[InotifyWaker] = None
+        self._stopped = False
+        if until is not None:
+            until.add_done_callback(lambda _: self.stop())
+
+    def stop(self):
+        self._stopped = True
+        if self._waker is not None:
+            self._waker.event.set()
+
+    def _open(self, seek_end: bool) -> bool:
+        try:
+            self._file = open(self.file_path, 'rb')
+        except FileNotFoundError:
+            return False
+        if seek_end:
+            self._file.seek(0, os.SEEK_END)
+        self._partial.clear()
+        return True
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_lines(self) -> List[str]:
+        data = self._file.read()
+        if not data:
+            return []
+        self._partial += data
+        *complete, rest = self._partial.split(b'\n')
+        self._partial = bytearray(rest[:self.max_line])
+        return [raw[:self.max_line].rstrip(b'\r').decode('utf-8', errors='replace') for raw in complete]
+
+    def _replaced(self) -> bool:
+        """True if the path now points at a different file (rotated) or this one was truncated."""
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            return False  # mid-rotation; keep the old file until the new one appears
+        current = os.fstat(self._file.fileno())
+        if st.st_ino != current.st_ino or st.st_dev != current.st_dev:
+            return True
+        if st.st_size < self._file.tell():
+            self._file.seek(0)
+            self._partial.clear()
+        return False
+
+    async def batches(self) -> AsyncIterator[List[str]]:
+        loop = asyncio.get_running_loop()
+        try:
+            self._waker = InotifyWaker(loop, path.dirname(path.abspath(self.file_path)),
+                                       path.basename(self.file_path))
+        except (OSError, AttributeError) as e:
+            logging.info(f"inotify unavailable for {self.file_path}, polling instead: {e}")
+
+        interval = self.min_interval
+        opened = self._open(seek_end=self.from_end)
+        try:
+            while not self._stopped:
+                if opened:
+                    lines = self._read_lines()
+                    if lines:
+                        interval = self.min_interval
+                        yield lines
+                        continue
+                    if self._replaced():
+                        # finish the old file, then pick up the new one from its first line
+                        lines = self._read_lines()
+                        self._close()
+                        opened = self._open(seek_end=False)
+                        if lines:
+                            yield lines
+                        continue
+                else:
+                    opened = self._open(seek_end=False)
+                    if opened:
+                        continue
+
+                if self._waker is not None:
+                    # the timeout is only a safety net for missed events
+                    await self._waker.wait(30)
+                else:
+                    await asyncio.sleep(interval)
+                    interval = min(interval * 2, self.max_interval)
+        finally:
+            self._close()
+            if self._waker is not None:
+                self._waker.close()
+                self._waker = None
@@ -1,18 +1,87 @@
-import sys
+import asyncio
+import logging
+import os
+import threading
+from typing import Dict
 
 import psutil
 
 
-def wait_or_when_cancelled(pid):
-    proc = psutil.Process(pid=int(pid))
-    while True:
+class ExitWatcher:
+    """Resolves one future per watched pid the moment that process exits.
+
+    Uses a pidfd registered with the event loop where the kernel supports it (Linux 5.3+), and otherwise
+    falls back to a single shared thread waiting on every remaining process with psutil.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._pidfds: Dict[int, int] = {}
+        self._polled: Dict[int, psutil.Process] = {}
+        self._polled_lock = threading.Lock()
+        self._poll_thread = None
+
+    def watch(self, pid: int) -> asyncio.Future:
+        fut = self._futures.get(pid)
+        if fut is not None:
+            return fut
+        fut = self.loop.create_future()
+        self._futures[pid] = fut
+
+        if hasattr(os, 'pidfd_open'):
+            try:
+                fd = os.pidfd_open(pid)
+            except ProcessLookupError:
+                self._exited(pid)
+                return fut
+            except OSError as e:  # ENOSYS on old kernels, EPERM in some sandboxes
+                logging.debug(f"pidfd_open({pid}) failed, polling instead: {e}")
+            else:
+                self._pidfds[pid] = fd
+                self.loop.add_reader(fd, self._exited, pid)
+                return fut
+
         try:
-            proc.wait(timeout=1)
-            exit(1)
-        except psutil.TimeoutExpired:
-            continue
-        except KeyboardInterrupt:
-            break
+            proc = psutil.Process(pid)
+        except psutil.NoSuchProcess:
+            self._exited(pid)
+            return fut
+        with self._polled_lock:
+            self._polled[pid] = proc
+            # decided under the lock the thread exits under, so it can't stop between our check and its last one
+            if self._poll_thread is None:
+                self._poll_thread = threading.Thread(target=self._poll, name="exit-watcher", daemon=True)
+                self._poll_thread.start()
+        return fut
+
+    def is_running(self, pid: int) -> bool:
+        fut = self._futures.get(pid)
+        return fut is not None and not fut.done()
 
+    def _poll(self):
+        while True:
+            with self._polled_lock:
+                procs = list(self._polled.values())
+                if not procs:
+                    self._poll_thread = None
+                    return
+            gone, _ = psutil.wait_procs(procs, timeout=1)
+            for proc in gone:
+                with self._polled_lock:
+                    self._polled.pop(proc.pid, None)
+                try:
+                    self.loop.call_soon_threadsafe(self._exited, proc.pid)
+                except RuntimeError:  # event loop already closed
+                    with self._polled_lock:
+                        self._poll_thread = None
+                    return
 
-wait_or_when_cancelled(sys.argv[1])
+    def _exited(self, pid: int):
+        fd = self._pidfds.pop(pid, None)
+        if fd is not None:
+            self.loop.remove_reader(fd)
+            os.close(fd)
+        fut = self._futures.pop(pid, None)  # a later process reusing the pid gets a fresh future
+        if fut is not None and not fut.done():
+            fut.set_result(pid)